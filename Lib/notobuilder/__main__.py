@@ -7,6 +7,16 @@ import sys
 
 from gftools.builder import GFBuilder, BASE_SCHEMA
 
+from notobuilder.buildcache import (
+    BuildCache,
+    default_cache_dir,
+    inputs_digest,
+    postprocess_stamps,
+)
+from notobuilder.pools import PooledWriter, pool_depths
+from notobuilder.profile import BuildProfile, ninja_log_position, read_ninja_log
+from notocommon.memory import add_memory_argument
+
 
 # These days I'm just gftools-builder in a funny hat.
 def main(args=None):
@@ -23,11 +33,42 @@ def main(args=None):
         help="Just generate and output recipe from recipe builder",
         action="store_true",
     )
+    parser.add_argument(
+        "--profile",
+        help="Time each phase and ninja step of the build and write a report",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--profile-output",
+        help="Write the profile to PREFIX.json and PREFIX.html, relative to the "
+        "config file (default: build-profile)",
+        default="build-profile",
+        metavar="PREFIX",
+    )
+    parser.add_argument(
+        "--no-cache",
+        help="Build every target, rather than restoring unchanged ones from the "
+        "build cache",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory of the build cache (default: %(default)s)",
+        default=default_cache_dir(),
+    )
+    parser.add_argument(
+        "--cache-size",
+        help="Size limit of the build cache in MB (default: %(default)s)",
+        type=int,
+        default=4096,
+    )
+    add_memory_argument(parser)
     parser.add_argument("config", help="Path to config file")
     args = parser.parse_args(args)
 
     with open(args.config, "r") as file:
         config = yaml.safe_load(file.read())
+    cache_dir = os.path.abspath(args.cache_dir)
     chdir(Path(args.config).resolve().parent)
 
     config["recipeProvider"] = "noto"
@@ -36,18 +77,68 @@ def main(args=None):
     # Only build OTFs if it's a release
     if "refs/tags" not in os.environ.get("GITHUB_REF", ""):
         config["buildOTF"] = False
-    pd = GFBuilder(config)
+    # Hash the config's other inputs before the recipe provider rewrites any
+    inputs = None if args.no_cache or args.generate else inputs_digest(config)
+    profile = BuildProfile()
+    with profile.phase("recipe"):
+        pd = GFBuilder(config)
     if args.generate:
         print(yaml.dump(pd.config))
         return
-    pd.config_to_objects()
-    pd.build_graph()
-    pd.walk_graph()
+    if inputs is not None:
+        cache = BuildCache(cache_dir, args.cache_size * 1024 * 1024)
+        keys = cache.keys(pd.recipe, inputs)
+    if args.max_memory:
+        depths = pool_depths(args.max_memory * 1024 * 1024)
+        print(
+            "Running at most "
+            + ", ".join(f"{depth} {name}" for name, depth in depths.items())
+            + " build steps at once"
+        )
+        # Rules are written as the recipe is turned into objects
+        pd.writer = PooledWriter(pd.writer.output, depths)
+    with profile.phase("config_to_objects"):
+        pd.config_to_objects()
+    with profile.phase("build_graph"):
+        pd.build_graph()
+    with profile.phase("walk_graph"):
+        pd.walk_graph()
     if args.graph:
         pd.draw_graph()
-    if not args.no_ninja:
-        result = subprocess.run(["ninja"])
-        sys.exit(result.returncode)
+    if args.no_ninja:
+        if args.profile:
+            profile.write(args.profile_output)
+        return
+    command = ["ninja"]
+    if inputs is not None:
+        stamps = postprocess_stamps(pd.graph, keys)
+        with profile.phase("cache_restore"):
+            restored = cache.restore(keys)
+        print(f"Restored {len(restored)} of {len(keys)} targets from the build cache")
+        if restored:
+            remaining = [target for target in keys if target not in restored]
+            if not remaining:
+                if args.profile:
+                    profile.write(args.profile_output)
+                return
+            # Ask for the final outputs of the rest: the stamps of their
+            # postprocessing steps, or the targets themselves if they have
+            # none. Asking for the default outputs would rebuild everything,
+            # as the restored targets' intermediate files are missing.
+            for target in remaining:
+                command += stamps[target] or [target]
+    log_position = ninja_log_position()
+    with profile.phase("ninja"):
+        result = subprocess.run(command)
+    if inputs is not None and result.returncode == 0:
+        with profile.phase("cache_save"):
+            cache.save({t: k for t, k in keys.items() if t not in restored}, stamps)
+    if args.profile:
+        ninja = profile.ninja_report(
+            pd.ninja_file_name, read_ninja_log(position=log_position)
+        )
+        profile.write(args.profile_output, ninja)
+    sys.exit(result.returncode)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,205 @@
+"""A content-addressed cache of built fonts.
+
+Ninja decides what to rebuild from file modification times, so on a fresh
+checkout or CI runner everything is built from scratch. This cache keys
+each target in the recipe by a hash of everything which goes into it: the
+sources its steps read (and those of any targets it is made from), its
+recipe steps, the rest of the config's settings and the input files they
+name (see INPUT_KEYS), and the versions of the build tools. A target whose
+key is in the cache is copied into place instead of being built, and ninja
+is only asked for the rest.
+
+A target is only finished once its postprocessing steps (such as building
+the STAT table of a family's variable fonts) have run, so it is only
+stored after the stamp files of those steps have been written."""
+
+import hashlib
+import json
+import os
+import shutil
+from importlib.metadata import PackageNotFoundError, version
+
+from notocommon.cache import ContentCache
+
+TOOLS = [
+    "notobuilder",
+    "gftools",
+    "fontmake",
+    "fonttools",
+    "ufo2ft",
+    "glyphsLib",
+    "ufomerge",
+    "ttfautohint-py",
+]
+
+# Config keys whose values name input files
+INPUT_KEYS = [
+    "stat",
+    "avar2",
+    "glyphData",
+    "stylespaceFile",
+    "vttSources",
+    "includeSubsets",
+    "fontsetter",
+]
+
+
+def default_cache_dir():
+    cache = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache, "notobuilder", "outputs")
+
+
+def tool_versions():
+    versions = {}
+    for tool in TOOLS:
+        try:
+            versions[tool] = version(tool)
+        except PackageNotFoundError:
+            versions[tool] = None
+    return versions
+
+
+def _hash_path(digest, path):
+    """Add a file, or every file in a directory (such as a UFO), to a hash"""
+    if os.path.isdir(path):
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in sorted(filenames):
+                _hash_path(digest, os.path.join(dirpath, filename))
+        return
+    digest.update(path.encode("utf-8") + b"\0")
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+
+
+def _referenced_paths(value, found):
+    """Collect every string in a config which names an existing file"""
+    if isinstance(value, dict):
+        for item in value.values():
+            _referenced_paths(item, found)
+    elif isinstance(value, list):
+        for item in value:
+            _referenced_paths(item, found)
+    elif isinstance(value, str) and os.path.exists(value):
+        found.add(os.path.normpath(value))
+        if value.endswith(".designspace"):
+            from fontTools.designspaceLib import DesignSpaceDocument
+
+            for source in DesignSpaceDocument.fromfile(value).sources:
+                if source.path and os.path.exists(source.path):
+                    found.add(os.path.relpath(source.path))
+
+
+def inputs_digest(config):
+    """Hash the config's settings and the files named by its INPUT_KEYS,
+    relative to the current directory. The sources are hashed target by
+    target, from the recipe. Other strings in the config which happen to
+    name a path, such as outputDir, are not inputs and are not hashed."""
+    settings = {k: v for k, v in config.items() if k != "sources"}
+    paths = set()
+    _referenced_paths([config[k] for k in INPUT_KEYS if k in config], paths)
+    digest = hashlib.sha256()
+    digest.update(json.dumps(settings, sort_keys=True, default=str).encode("utf-8"))
+    for path in sorted(paths):
+        if os.path.isfile(path):
+            _hash_path(digest, path)
+    return digest.hexdigest()
+
+
+def _recipe_closure(recipe, target, seen):
+    """The target and any other recipe targets its steps consume, whether as
+    a source or (like gftools does for postprocesses) named in an argument"""
+    if target in seen:
+        return
+    seen.add(target)
+    for step in recipe[target]:
+        for value in step.values():
+            values = value if isinstance(value, list) else [value]
+            for v in values:
+                if not isinstance(v, str):
+                    continue
+                for other in recipe:
+                    if other in v:
+                        _recipe_closure(recipe, other, seen)
+
+
+def _step_inputs(recipe, steps):
+    """The files named by the source steps and needs of some recipe steps,
+    other than recipe targets (which are covered by their own steps)"""
+    inputs = []
+    for step in steps:
+        if "source" in step:
+            inputs.append(step["source"])
+        needs = step.get("needs", [])
+        inputs.extend(needs if isinstance(needs, list) else [needs])
+    found = set()
+    _referenced_paths([i for i in inputs if i not in recipe], found)
+    return sorted(found)
+
+
+def postprocess_stamps(graph, targets):
+    """The stamp files of the postprocessing steps run on each target, from
+    the builder's graph"""
+    stamps = {target: [] for target in targets}
+    for source, stamp, edge in graph.edges(data=True):
+        operation = edge.get("operation")
+        if operation is not None and operation.postprocess and source.path in stamps:
+            stamps[source.path].append(stamp.path)
+    return stamps
+
+
+class BuildCache(object):
+    def __init__(self, root, max_size):
+        self.store = ContentCache(root, max_size=max_size)
+
+    def keys(self, recipe, inputs):
+        """Work out the cache key of every target in a recipe. This must be
+        called before the builder turns the recipe's steps into objects."""
+        versions = tool_versions()
+        # Many targets are built from the same sources
+        digests = {}
+        keys = {}
+        for target in recipe:
+            closure = set()
+            _recipe_closure(recipe, target, closure)
+            steps = {t: recipe[t] for t in sorted(closure)}
+            sources = {}
+            for path in _step_inputs(recipe, sum(steps.values(), [])):
+                if path not in digests:
+                    digest = hashlib.sha256()
+                    _hash_path(digest, path)
+                    digests[path] = digest.hexdigest()
+                sources[path] = digests[path]
+            keys[target] = hashlib.sha256(
+                json.dumps(
+                    [inputs, versions, target, steps, sources],
+                    sort_keys=True,
+                    default=str,
+                ).encode("utf-8")
+            ).hexdigest()
+        return keys
+
+    def restore(self, keys):
+        """Copy every cached target into place, returning those restored"""
+        restored = []
+        for target, key in keys.items():
+            blob = self.store.open(key)
+            if blob is None:
+                continue
+            os.makedirs(os.path.dirname(target) or ".", exist_ok=True)
+            with blob, open(target, "wb") as f:
+                shutil.copyfileobj(blob, f)
+            restored.append(target)
+        return restored
+
+    def save(self, keys, stamps):
+        """Store the given targets after a successful build. Targets whose
+        postprocessing has not run are left out."""
+        for target, key in keys.items():
+            if not os.path.isfile(target):
+                continue
+            if not all(os.path.exists(stamp) for stamp in stamps.get(target, [])):
+                continue
+            with open(target, "rb") as f:
+                self.store.put(key, f.read())
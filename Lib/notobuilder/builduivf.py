@@ -1,117 +1,239 @@
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import replace
+from itertools import repeat
+import os
 import sys
 import glyphsLib
 from fontTools.ttLib import TTFont
-from fontTools.pens.transformPen import TransformPen
-from fontTools.pens.ttGlyphPen import TTGlyphPen
 
 def transform(ttfont, x, y):
-    glyphset = ttfont.getGlyphSet()
+    """Offset every outline in the font by (x, y).
 
-    for glyphname in glyphset.keys():
-        glyph = glyphset[glyphname]
-        if glyph._getGlyphAndOffset()[0].numberOfContours < 1:
+    Simple glyphs have their coordinates shifted in place; composites are
+    left alone since they follow their components. Variation deltas are
+    relative, so gvar needs no changes, but the side bearings do."""
+    glyf = ttfont["glyf"]
+    hmtx = ttfont["hmtx"]
+    vmtx = ttfont["vmtx"] if "vmtx" in ttfont else None
+
+    for glyphname in ttfont.getGlyphOrder():
+        glyph = glyf[glyphname]
+        if glyph.numberOfContours == 0:
             continue
-        pen = TTGlyphPen(glyphset)
-        transformpen = TransformPen(pen, (1, 0, 0, 1, x, y))
-        glyph.draw(transformpen)
-        transformed = pen.glyph()
-        ttfont['glyf'].glyphs[glyphname] = transformed
+        if glyph.numberOfContours > 0:
+            glyph.coordinates.translate((x, y))
+            glyph.xMin += x
+            glyph.xMax += x
+            glyph.yMin += y
+            glyph.yMax += y
+        advance, lsb = hmtx[glyphname]
+        hmtx[glyphname] = (advance, lsb + x)
+        if vmtx is not None:
+            advance, tsb = vmtx[glyphname]
+            vmtx[glyphname] = (advance, tsb - y)
 
 def reencode(ttfont, glyph, cp):
     for subtable in ttfont["cmap"].tables:
         subtable.cmap[cp] = glyph
 
-def grovel_substitutions(font, lookup, glyphmap):
-    if lookup.LookupType == 7:
-        raise NotImplementedError
-    gmap = lambda g: glyphmap.get(g,g)
-    go = font.getGlyphOrder()
+def ui_glyphmap(ttfont):
+    """Map each glyph which has a UI variant to that variant"""
+    glyph_names = set(ttfont.getGlyphOrder())
+    return {
+        g.replace("UI", ""): g
+        for g in ttfont.getGlyphOrder()
+        if "UI" in g and g.replace("UI", "") in glyph_names
+    }
 
-    def do_coverage(c):
-        c.glyphs = list(sorted([gmap(g) for g in c.glyphs], key=lambda g:go.index(g)))
-        return c
+class GlyphRemapper(object):
+    """Swaps glyph references in layout tables for their UI variants"""
 
-    for st in lookup.SubTable:
-        if lookup.LookupType == 1:
-            newmap = {}
-            for inglyph, outglyph in st.mapping.items():
-                newmap[gmap(inglyph)] = gmap(outglyph)
-            st.mapping = newmap
-        elif lookup.LookupType == 2:
-            newmap = {}
-            for inglyph, outglyphs in st.mapping.items():
-                newmap[gmap(inglyph)] = [gmap(g) for g in outglyphs]
-            st.mapping = newmap
-        elif lookup.LookupType == 4:
+    def __init__(self, font, glyphmap):
+        self.glyphmap = glyphmap
+        self.glyph_ids = font.getReverseGlyphMap()
+
+    def glyph(self, g):
+        return self.glyphmap.get(g, g)
+
+    def glyphs(self, glyphs):
+        return [self.glyphmap.get(g, g) for g in glyphs]
+
+    def class_def(self, class_def):
+        if class_def is not None:
+            class_def.classDefs = {self.glyph(k): v for k, v in class_def.classDefs.items()}
+
+    def coverage(self, coverage, *arrays):
+        """Remap a coverage table, keeping any arrays indexed by coverage in
+        step with it. Returns the reordered arrays."""
+        old = coverage.glyphs
+        new = self.glyphs(old)
+        # If a glyph and its UI variant are both covered, the UI variant's
+        # own entry wins.
+        order = sorted(
+            range(len(new)), key=lambda i: (self.glyph_ids[new[i]], new[i] != old[i])
+        )
+        seen = set()
+        order = [i for i in order if not (new[i] in seen or seen.add(new[i]))]
+        coverage.glyphs = [new[i] for i in order]
+        return [[array[i] for i in order] for array in arrays]
+
+    def coverages(self, coverages):
+        for coverage in coverages:
+            self.coverage(coverage)
+
+    def context(self, st, kind):
+        """Remap a (chained) contextual subtable; kind is "Sub" or "Pos" for
+        contextual lookups and "ChainSub" or "ChainPos" for chained ones."""
+        if st.Format == 1:
+            rule_sets = getattr(st, kind + "RuleSet")
+            (rule_sets,) = self.coverage(st.Coverage, rule_sets)
+            setattr(st, kind + "RuleSet", rule_sets)
+            for rule_set in rule_sets:
+                if rule_set is None:
+                    continue
+                for rule in getattr(rule_set, kind + "Rule"):
+                    rule.Input = self.glyphs(rule.Input)
+                    if kind.startswith("Chain"):
+                        rule.Backtrack = self.glyphs(rule.Backtrack)
+                        rule.LookAhead = self.glyphs(rule.LookAhead)
+        elif st.Format == 2:
+            self.coverage(st.Coverage)
+            if kind.startswith("Chain"):
+                self.class_def(st.BacktrackClassDef)
+                self.class_def(st.InputClassDef)
+                self.class_def(st.LookAheadClassDef)
+            else:
+                self.class_def(st.ClassDef)
+        elif st.Format == 3:
+            if kind.startswith("Chain"):
+                self.coverages(st.BacktrackCoverage)
+                self.coverages(st.InputCoverage)
+                self.coverages(st.LookAheadCoverage)
+            else:
+                self.coverages(st.Coverage)
+
+    def substitution(self, st, lookup_type):
+        gmap = self.glyph
+        if lookup_type == 1:
+            st.mapping = {gmap(i): gmap(o) for i, o in st.mapping.items()}
+        elif lookup_type == 2:
+            st.mapping = {gmap(i): self.glyphs(o) for i, o in st.mapping.items()}
+        elif lookup_type == 3:
+            st.alternates = {gmap(i): self.glyphs(o) for i, o in st.alternates.items()}
+        elif lookup_type == 4:
             newligatures = {}
             for outglyph, inglyphs in st.ligatures.items():
                 for ig in inglyphs:
                     ig.LigGlyph = gmap(ig.LigGlyph)
-                    ig.Component = [gmap(c) for c in ig.Component]
+                    ig.Component = self.glyphs(ig.Component)
                 newligatures[gmap(outglyph)] = inglyphs
             st.ligatures = newligatures
-        elif lookup.LookupType == 5:
-            if st.Format == 1:
-                do_coverage(st.Coverage)
-                for srs in st.SubRuleSet:
-                    for subrule in srs.SubRule:
-                        subrule.Input = [gmap(c) for c in subrule.Input]
-            elif st.Format == 2:
-                do_coverage(st.Coverage)
-                st.ClassDef.classDefs = {gmap(k):v for k,v in st.ClassDef.classDefs.items()}
+        elif lookup_type == 5:
+            self.context(st, "Sub")
+        elif lookup_type == 6:
+            self.context(st, "ChainSub")
+        elif lookup_type == 7:
+            self.substitution(st.ExtSubTable, st.ExtensionLookupType)
+        elif lookup_type == 8:
+            (st.Substitute,) = self.coverage(st.Coverage, self.glyphs(st.Substitute))
+            self.coverages(st.BacktrackCoverage)
+            self.coverages(st.LookAheadCoverage)
+
+    def positioning(self, st, lookup_type):
+        if lookup_type == 1:
+            if st.Format == 2:
+                (st.Value,) = self.coverage(st.Coverage, st.Value)
             else:
-                st.Coverage = [do_coverage(c) for c in st.Coverage]
-        elif lookup.LookupType == 6:
+                self.coverage(st.Coverage)
+        elif lookup_type == 2:
             if st.Format == 1:
-                do_coverage(st.Coverage)
-                for srs in st.ChainSubRuleSet:
-                    for subrule in srs.ChainSubRule:
-                        subrule.Backtrack = [gmap(c) for c in subrule.Backtrack]
-                        subrule.Input = [gmap(c) for c in subrule.Input]
-                        subrule.LookAhead = [gmap(c) for c in subrule.LookAhead]
-            elif st.Format == 2:
-                do_coverage(st.Coverage)
-                st.BacktrackClassDef.classDefs = {gmap(k):v for k,v in st.BacktrackClassDef.classDefs.items()}
-                st.InputClassDef.classDefs = {gmap(k):v for k,v in st.InputClassDef.classDefs.items()}
-                st.LookAheadClassDef.classDefs = {gmap(k):v for k,v in st.LookAheadClassDef.classDefs.items()}
-            elif st.Format == 3:
-                st.BacktrackCoverage = [ do_coverage(c) for c in st.BacktrackCoverage]
-                st.InputCoverage = [ do_coverage(c) for c in st.InputCoverage]
-                st.LookAheadCoverage = [ do_coverage(c) for c in st.LookAheadCoverage]
+                (st.PairSet,) = self.coverage(st.Coverage, st.PairSet)
+                for pair_set in st.PairSet:
+                    records = {}
+                    for record in pair_set.PairValueRecord:
+                        old = record.SecondGlyph
+                        record.SecondGlyph = self.glyph(old)
+                        if record.SecondGlyph not in records or old == record.SecondGlyph:
+                            records[record.SecondGlyph] = record
+                    pair_set.PairValueRecord = sorted(
+                        records.values(), key=lambda r: self.glyph_ids[r.SecondGlyph]
+                    )
+            else:
+                self.coverage(st.Coverage)
+                self.class_def(st.ClassDef1)
+                self.class_def(st.ClassDef2)
+        elif lookup_type == 3:
+            (st.EntryExitRecord,) = self.coverage(st.Coverage, st.EntryExitRecord)
+        elif lookup_type == 4:
+            (st.MarkArray.MarkRecord,) = self.coverage(
+                st.MarkCoverage, st.MarkArray.MarkRecord
+            )
+            (st.BaseArray.BaseRecord,) = self.coverage(
+                st.BaseCoverage, st.BaseArray.BaseRecord
+            )
+        elif lookup_type == 5:
+            (st.MarkArray.MarkRecord,) = self.coverage(
+                st.MarkCoverage, st.MarkArray.MarkRecord
+            )
+            (st.LigatureArray.LigatureAttach,) = self.coverage(
+                st.LigatureCoverage, st.LigatureArray.LigatureAttach
+            )
+        elif lookup_type == 6:
+            (st.Mark1Array.MarkRecord,) = self.coverage(
+                st.Mark1Coverage, st.Mark1Array.MarkRecord
+            )
+            (st.Mark2Array.Mark2Record,) = self.coverage(
+                st.Mark2Coverage, st.Mark2Array.Mark2Record
+            )
+        elif lookup_type == 7:
+            self.context(st, "Pos")
+        elif lookup_type == 8:
+            self.context(st, "ChainPos")
+        elif lookup_type == 9:
+            self.positioning(st.ExtSubTable, st.ExtensionLookupType)
 
-if __name__ == "__main__":
-    # Parse command line arguments
-    parser = argparse.ArgumentParser(description='Generate a UI font from existing binary and Glyphs file')
-    parser.add_argument('--output', '-o', help='Output font file')
-    parser.add_argument('binary', help='Binary font file')
-    parser.add_argument('glyphs', help='Glyphs file')
-    args = parser.parse_args()
+def grovel_substitutions(font, lookup, glyphmap):
+    remap = GlyphRemapper(font, glyphmap)
+    for st in lookup.SubTable:
+        remap.substitution(st, lookup.LookupType)
 
-    if not args.output:
-        if "-VF.ttf" not in args.binary:
-            print("Error: Output file not specified")
-            sys.exit(1)
-        args.output = args.binary.replace('-VF.ttf', 'UI-VF.ttf')
+def grovel_positioning(font, lookup, glyphmap):
+    remap = GlyphRemapper(font, glyphmap)
+    for st in lookup.SubTable:
+        remap.positioning(st, lookup.LookupType)
 
-    gsfont = glyphsLib.GSFont(args.glyphs)
-    ttfont = TTFont(args.binary)
+def grovel_gdef(font, glyphmap):
+    remap = GlyphRemapper(font, glyphmap)
+    gdef = font["GDEF"].table
+    remap.class_def(gdef.GlyphClassDef)
+    remap.class_def(getattr(gdef, "MarkAttachClassDef", None))
+    if getattr(gdef, "AttachList", None):
+        attach = gdef.AttachList
+        (attach.AttachPoint,) = remap.coverage(attach.Coverage, attach.AttachPoint)
+    if getattr(gdef, "LigCaretList", None):
+        carets = gdef.LigCaretList
+        (carets.LigGlyph,) = remap.coverage(carets.Coverage, carets.LigGlyph)
+    if getattr(gdef, "MarkGlyphSetsDef", None):
+        remap.coverages(gdef.MarkGlyphSetsDef.Coverage)
 
-    # Find UI instances
-    cp = None
+def ui_parameters(gsfont):
+    """Return the custom parameters of the UI instance of a Glyphs font"""
     for instance in gsfont.instances:
         if "UI" in instance.familyName:
-            cp = instance.customParameters
-            break
-
-    if cp is None:
-        print("No UI instance found")
-        sys.exit(1)
+            return { p.name: p.value for p in instance.customParameters }
+    raise ValueError("No UI instance found")
 
-    cp = { p.name: p.value for p in cp }
-    print("Creating UI font with custom parameters %s" % cp)
+def ui_output_path(binary):
+    """NotoSansFoo-VF.ttf becomes NotoSansFooUI-VF.ttf, and so on"""
+    directory, filename = os.path.split(binary)
+    if "-" not in filename:
+        raise ValueError("Cannot derive a UI font name from %s" % binary)
+    stem, rest = filename.split("-", 1)
+    return os.path.join(directory, stem + "UI-" + rest)
 
+def make_ui_font(ttfont, cp):
+    """Turn a font into its UI variant using the UI instance's custom parameters"""
     if "typoAscender" in cp:
         ttfont['OS/2'].sTypoAscender = int(cp["typoAscender"])
     if "typoDescender" in cp:
@@ -137,8 +259,7 @@ if __name__ == "__main__":
         filter_args = filter_args[1:-1]
         filter_args = { arg.split(":")[0]: arg.split(":")[1] for arg in filter_args }
         if "ScaleX" in filter_args or "ScaleY" in filter_args:
-            print("ScaleX and ScaleY are not supported")
-            sys.exit(1)
+            raise ValueError("ScaleX and ScaleY are not supported")
         offset_x = int(filter_args.get("OffsetX", "0"))
         offset_y = int(filter_args.get("OffsetY", "0"))
         if offset_x or offset_y:
@@ -150,18 +271,100 @@ if __name__ == "__main__":
             glyph, codepoint = parm.split("=")
             reencode(ttfont, glyph, int(codepoint, 16))
 
-    # Mash the GSUB table
-    uis = [ x for x in ttfont.getGlyphOrder() if "UI" in x and x.replace("UI", "") in ttfont.getGlyphOrder() ]
-    glyphmap =  { g.replace("UI", ""): g for g in uis}
-    for lookup in ttfont["GSUB"].table.LookupList.Lookup:
-        grovel_substitutions(ttfont, lookup, glyphmap)
+    # Mash the layout tables
+    glyphmap = ui_glyphmap(ttfont)
+    if "GSUB" in ttfont and ttfont["GSUB"].table.LookupList:
+        for lookup in ttfont["GSUB"].table.LookupList.Lookup:
+            grovel_substitutions(ttfont, lookup, glyphmap)
+    if "GPOS" in ttfont and ttfont["GPOS"].table.LookupList:
+        for lookup in ttfont["GPOS"].table.LookupList.Lookup:
+            grovel_positioning(ttfont, lookup, glyphmap)
+    if "GDEF" in ttfont:
+        grovel_gdef(ttfont, glyphmap)
 
-    # Mash the name table
+    rename_ui_font(ttfont)
+
+def rename_ui_font(ttfont):
+    """Add "UI" to the family names of a font, and rebuild its full and
+    PostScript names (and unique ID) from the new family name and the style,
+    so that the UI font never shares a name with the font it came from"""
     name = ttfont["name"]
-    name.setName(name.getName(1,3,1).toUnicode()+" UI", 1, 3, 1, 0x409)
-    name.setName(name.getName(3,3,1).toUnicode().replace("-","UI-"), 3, 3, 1, 0x409)
-    name.setName(name.getName(4,3,1).toUnicode().replace(" Regular","UI Regular"), 4, 3, 1, 0x409)
-    name.setName(name.getName(6,3,1).toUnicode().replace("-Regular","UI-Regular"), 6, 3, 1, 0x409)
+    def get_name(name_id):
+        record = name.getName(name_id, 3, 1, 0x409)
+        return record.toUnicode() if record else None
+    def set_name(value, name_id):
+        name.setName(value, name_id, 3, 1, 0x409)
+
+    family = get_name(16) or get_name(1)
+    style = get_name(17) or get_name(2)
+    ui_family = family + " UI"
+    if get_name(16):
+        # Legacy family names of non-RIBBI styles carry the style too,
+        # e.g. "Noto Sans Foo Light" for "Noto Sans Foo" / "Light"
+        set_name(ui_family, 16)
+        set_name(get_name(1).replace(family, ui_family, 1), 1)
+    else:
+        set_name(ui_family, 1)
+    set_name(ui_family + " " + style, 4)
+
+    postscript = get_name(6)
+    if "-" in postscript:
+        stem, rest = postscript.split("-", 1)
+        ui_postscript = stem + "UI-" + rest
+    else:
+        ui_postscript = postscript + "UI"
+    set_name(ui_postscript, 6)
+    unique_id = get_name(3)
+    if unique_id and postscript in unique_id:
+        set_name(unique_id.replace(postscript, ui_postscript), 3)
+    if get_name(25):
+        set_name(get_name(25) + "UI", 25)
+
+def derive_ui_font(binary, output, cp):
+    ttfont = TTFont(binary)
+    make_ui_font(ttfont, cp)
+    ttfont.save(output)
+    return output
 
+def derive_ui_fonts(binaries, glyphs, outputs=None, jobs=None):
+    """Derive UI variants of many binaries from one Glyphs source.
 
-    ttfont.save(args.output)
+    glyphs may be a path or an already-parsed GSFont; it is only read once.
+    Binaries which are already UI fonts are skipped. The fonts are processed
+    in parallel across `jobs` processes. Returns the paths written."""
+    if not isinstance(glyphs, glyphsLib.GSFont):
+        glyphs = glyphsLib.GSFont(glyphs)
+    cp = ui_parameters(glyphs)
+    print("Creating UI fonts with custom parameters %s" % cp)
+
+    if outputs is None:
+        binaries = [b for b in binaries if "UI" not in os.path.basename(b)]
+        outputs = [ui_output_path(b) for b in binaries]
+    if len(binaries) == 1:
+        return [derive_ui_font(binaries[0], outputs[0], cp)]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(derive_ui_font, binaries, outputs, repeat(cp)))
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Generate UI fonts from existing binaries and a Glyphs file')
+    parser.add_argument('--output', '-o', help='Output font file (only with a single binary)')
+    parser.add_argument('--jobs', '-j', type=int, help='Number of fonts to process at once')
+    parser.add_argument('binary', nargs='+', help='Binary font files')
+    parser.add_argument('glyphs', help='Glyphs file')
+    args = parser.parse_args(args)
+
+    outputs = None
+    if args.output:
+        if len(args.binary) > 1:
+            parser.error("--output can only be used with a single binary")
+        outputs = [args.output]
+
+    try:
+        for output in derive_ui_fonts(args.binary, args.glyphs, outputs, args.jobs):
+            print("Wrote %s" % output)
+    except ValueError as e:
+        print("Error: %s" % e)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
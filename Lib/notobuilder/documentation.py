@@ -2,37 +2,99 @@
 # -*- coding: utf-8 -*-
 
 import argparse
+import hashlib
+import json
 import logging
+import sys
 from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
 
-import fontTools.ttLib
-import youseedee
-import markdown
-from gftools.utils import primary_script
-from gflanguages import LoadScripts
 import yaml
-from jinja2 import Environment, PackageLoader, select_autoescape
-from tidylib import tidy_document
 
+from notobuilder.fontinfo import FontMetadata
+from notobuilder.ucdranges import ucd_ranges
 
-jinja = Environment(
-    loader=PackageLoader(__package__, "templates"), autoescape=select_autoescape()
-)
-jinja.trim_blocks = True
-jinja.lstrip_blocks = True
+# The Unicode data, language data, templates and HTML tools are only loaded
+# when first needed, so that importing this module stays cheap.
+
+
+@lru_cache(maxsize=None)
+def jinja_environment():
+    from jinja2 import Environment, PackageLoader, select_autoescape
+
+    jinja = Environment(
+        loader=PackageLoader(__package__, "templates"), autoescape=select_autoescape()
+    )
+    jinja.trim_blocks = True
+    jinja.lstrip_blocks = True
+    return jinja
+
+
+@lru_cache(maxsize=None)
+def template(name):
+    return jinja_environment().get_template(name)
+
+
+@lru_cache(maxsize=None)
+def markdown_converter():
+    import markdown
+
+    return markdown.Markdown()
+
+
+@lru_cache(maxsize=None)
+def html_tidier():
+    # One tidy document, reused for every page this process writes. Every
+    # call passes the same options, so none leak from one page to the next.
+    from tidylib import PersistentTidy
+
+    return PersistentTidy()
+
+
+TIDY_OPTIONS = {"show-body-only": "y"}
+
+
+def render_html(md):
+    """Convert Markdown to tidied HTML"""
+    html = markdown_converter().reset().convert(md)
+    document, errors = html_tidier().tidy_document(html, TIDY_OPTIONS)
+    return document
+
+
+def write_outputs(outputs):
+    """Write a dictionary of path: text, all in one go"""
+    for path, text in outputs.items():
+        logging.info(f"Saving {path}")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+@lru_cache(maxsize=None)
+def script_aliases():
+    import youseedee
+
+    aliases = {}
+    with open(Path(youseedee.ucd_dir()) / "PropertyValueAliases.txt", "r") as f:
+        for line in f:
+            if line.startswith("#"):
+                continue
+            line = line.strip()
+            if not line:
+                continue
+            parts = line.split(";")
+            if parts[0].strip() == "sc":
+                aliases[parts[2].strip()] = parts[1].strip()
+    return aliases
+
+
+@lru_cache(maxsize=None)
+def scripts_info():
+    from gflanguages import LoadScripts
+
+    return LoadScripts()
 
-script_aliases = {}
-with open(Path(youseedee.ucd_dir()) / "PropertyValueAliases.txt", "r") as f:
-    for line in f:
-        if line.startswith("#"):
-            continue
-        line = line.strip()
-        if not line:
-            continue
-        parts = line.split(";")
-        if parts[0].strip() == "sc":
-            script_aliases[parts[2].strip()] = parts[1].strip()
 
 logging.basicConfig(level=logging.WARN)
 
@@ -47,8 +109,6 @@ update_odd_scripts = {
     "Zsym": "Zyyy",
 }
 
-scripts_info = LoadScripts()
-
 
 class FontDescription(object):
 
@@ -67,39 +127,48 @@ class FontDescription(object):
         self.is_UI = "UI" in path.name
         self.is_mono = "Mono" in path.name
         self.has_italic = False
-        self.font = fontTools.ttLib.TTFont(path)
-        self.noto_script = article.get(
-            "script", primary_script(self.font, ignore_latin=True)
-        )
-        if "STAT" in self.font:
-            stat_tags = [
-                axis.AxisTag for axis in self.font["STAT"].table.DesignAxisRecord.Axis
-            ]
-            if "ital" in stat_tags:
-                self.has_italic = True
-
-        self.unicodes = list(self.font.getBestCmap().keys())
+        self.font = FontMetadata(path)
+        self.noto_script = article.get("script")
+        if "script" not in article:
+            # This needs the whole font, layout tables and all
+            from gftools.utils import primary_script
+
+            self.noto_script = primary_script(self.font.ttfont, ignore_latin=True)
+        if "ital" in self.font.stat_axis_tags():
+            self.has_italic = True
+
+        self.unicodes = self.font.codepoints()
         self.scripts = OrderedDict()
         self.blocks = OrderedDict()
-        self.family_name = self.font["name"].getDebugName(16) or self.font[
-            "name"
-        ].getDebugName(1)
-        self.glyphs_count = len(self.font.getGlyphOrder())
+        name = self.font.name
+        self.family_name = name.getDebugName(16) or name.getDebugName(1)
+        self.glyphs_count = self.font.num_glyphs
         self.features_count = 0
         self.art = ""
         self.desc = ""
         self.build_features_count()
         self.build_axes()
+        self.count_characters()
         self.build_scripts()
         self.build_blocks()
         self.build_desc()
 
+    def count_characters(self):
+        """Count the letters and symbols of each script and block in one pass"""
+        ranges = ucd_ranges()
+        aliases = script_aliases()
+        codepoints = sorted(self.unicodes)
+        categories = ranges["General_Category"].lookup_all(codepoints)
+        scripts = ranges["Script"].lookup_all(codepoints)
+        blocks = ranges["Block"].lookup_all(codepoints)
+        for category, script, block in zip(categories, scripts, blocks):
+            if category[0] in ("N", "C"):
+                continue
+            script = aliases[script]
+            self.scripts[script] = self.scripts.get(script, 0) + 1
+            self.blocks[block] = self.blocks.get(block, 0) + 1
+
     def build_scripts(self):
-        for u in self.unicodes:
-            data = youseedee.ucd_data(u)
-            if data["General_Category"][0] not in ("N", "C"):
-                script = script_aliases[data["Script"]]
-                self.scripts[script] = self.scripts.get(script, 0) + 1
         self.scripts = OrderedDict(
             sorted(self.scripts.items(), key=lambda t: t[1], reverse=True)
         )
@@ -124,11 +193,6 @@ class FontDescription(object):
                     del self.scripts[k]
 
     def build_blocks(self):
-        for u in self.unicodes:
-            data = youseedee.ucd_data(u)
-            if data["General_Category"][0] not in ("N", "C"):
-                block = data["Block"]
-                self.blocks[block] = self.blocks.get(block, 0) + 1
         self.blocks = OrderedDict(
             sorted(self.blocks.items(), key=lambda t: t[1], reverse=True)
         )
@@ -144,11 +208,11 @@ class FontDescription(object):
             italic_text = "italic styles, "
         axes_simple = []
         axes_custom = []
-        fvar = self.font.get("fvar", None)
-        name = self.font["name"]
+        fvar_axes = self.font.fvar_axes()
+        name = self.font.name
         comma = ""
-        if fvar:
-            for axis in fvar.axes:
+        if fvar_axes:
+            for axis in fvar_axes:
                 if axis.maxValue > axis.minValue:
                     axisname = name.getName(axis.axisNameID, 3, 1).toUnicode().lower()
                     if axisname in ("weight", "width"):
@@ -172,17 +236,8 @@ class FontDescription(object):
 
     def build_features_count(self):
         features = set()
-        for table in [self.font.get("GSUB"), self.font.get("GPOS")]:
-            if not table:
-                continue
-            features.update(
-                set(
-                    [
-                        FeatureRecord.FeatureTag
-                        for FeatureRecord in table.table.FeatureList.FeatureRecord
-                    ]
-                )
-            )
+        for table_tag in ("GSUB", "GPOS"):
+            features.update(self.font.feature_tags(table_tag))
         self.features_count = len(sorted(list(features)))
 
     def build_desc(self):
@@ -198,40 +253,173 @@ class FontDescription(object):
             is_UI=self.is_UI,
             axes=self.axes,
             scripts=list(self.scripts.keys()),
-            scripts_info=scripts_info,
+            scripts_info=scripts_info(),
             blocks=list(self.blocks.keys()),
         )
 
-        self.art = jinja.get_template("font_article.md").render(**variables)
-        self.desc = jinja.get_template("font_desc.md").render(**variables)
+        self.art = template("font_article.md").render(**variables)
+        self.desc = template("font_desc.md").render(**variables)
 
     def save(self, path, md):
-        logging.info(f"Saving {path}")
-        with open(path, "w", encoding="utf-8") as f:
-            document, errors = tidy_document(
-                markdown.markdown(md), {"show-body-only": "y"}
-            )
-            f.write(document)
+        write_outputs({path: render_html(md)})
+
+
+def render_documentation(font, config):
+    """Render the article and description HTML for the family of a font,
+    returning a dictionary of path: HTML"""
+    art_desc = FontDescription(font, config, noto=True)
+
+    if font.parts[0] != "fonts":
+        print("Expected a path of the form fonts/NotoSansWhatever/...")
+    family_path = font.parts[1]
+
+    art_path = Path("documentation") / (family_path + ".article.html")
+    desc_path = Path("documentation") / (family_path + ".html")
+    return {
+        art_path: render_html(art_desc.art),
+        desc_path: render_html(art_desc.desc),
+    }
+
+
+def write_documentation(font, config):
+    """Write the article and description HTML for the family of a font"""
+    write_outputs(render_documentation(font, config))
+
+
+def best_font(family_dir):
+    """Pick the font which best represents a family: the upright variable
+    font if there is one, otherwise the Regular, otherwise anything."""
+    for pattern in ("unhinted/variable-ttf/*.ttf", "unhinted/ttf/*.ttf", "**/*.ttf"):
+        fonts = sorted(
+            f for f in family_dir.glob(pattern) if "Italic" not in f.name
+        ) or sorted(family_dir.glob(pattern))
+        fonts = [f for f in fonts if "UI" not in f.name] or fonts
+        if not fonts:
+            continue
+        regular = [f for f in fonts if f.stem.endswith("-Regular")]
+        return (regular or fonts)[0]
+    return None
+
+
+def family_config(family, configs):
+    """Find the config whose familyName matches a family directory, or None"""
+    for config in configs:
+        if config.get("familyName", "").replace(" ", "") == family:
+            return config
+    return None
+
+
+def documentation_hash(font, config):
+    digest = hashlib.sha256()
+    with open(font, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    digest.update(json.dumps(config, sort_keys=True, default=str).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def write_all_documentation(configs, jobs=None, force=False):
+    """Write documentation for every family in fonts/ in one process (or one
+    pool of processes), skipping families whose best font and config have
+    not changed since the documentation was last written. Each family uses
+    the config whose familyName matches it; families without one are
+    skipped with a warning. Returns the families which could not be
+    documented."""
+    hashes_path = Path("documentation") / ".hashes.json"
+    hashes = {}
+    if hashes_path.exists():
+        hashes = json.loads(hashes_path.read_text())
+
+    work = []
+    family_dirs = [p for p in Path("fonts").glob("*/") if p.is_dir()]
+    for family_dir in sorted(family_dirs):
+        family = family_dir.name
+        font = best_font(family_dir)
+        if font is None:
+            print(f"No font found for {family}, skipping")
+            continue
+        config = family_config(family, configs)
+        if config is None:
+            print(f"Warning: no config has a familyName matching {family}, skipping")
+            continue
+        digest = documentation_hash(font, config)
+        outputs = [
+            Path("documentation") / (family + ".article.html"),
+            Path("documentation") / (family + ".html"),
+        ]
+        if not force and hashes.get(family) == digest and all(
+            o.exists() for o in outputs
+        ):
+            print(f"{family} is unchanged, skipping")
+            continue
+        work.append((family, font, config, digest))
+
+    # Pages are rendered first (in the workers, if there are any) and
+    # written out together at the end.
+    failed = []
+    outputs = {}
+    if len(work) <= 1 or jobs == 1:
+        for family, font, config, digest in work:
+            try:
+                outputs.update(render_documentation(font, config))
+            except Exception as e:
+                print(f"Could not document {family}: {e}")
+                failed.append(family)
+                continue
+            hashes[family] = digest
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {
+                pool.submit(render_documentation, font, config): (family, digest)
+                for family, font, config, digest in work
+            }
+            for future in as_completed(futures):
+                family, digest = futures[future]
+                try:
+                    outputs.update(future.result())
+                except Exception as e:
+                    print(f"Could not document {family}: {e}")
+                    failed.append(family)
+                    continue
+                hashes[family] = digest
+
+    hashes_path.parent.mkdir(exist_ok=True)
+    write_outputs(outputs)
+    hashes_path.write_text(json.dumps(hashes, indent=1, sort_keys=True))
+    return failed
 
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument("-c", "--config", help="YAML configuration file", required=True)
     parser.add_argument(
-        "-f", "--font", help="Path to best font file", required=True, type=Path
+        "-c",
+        "--config",
+        help="YAML configuration file (may be given more than once with --all)",
+        required=True,
+        action="append",
+    )
+    parser.add_argument("-f", "--font", help="Path to best font file", type=Path)
+    parser.add_argument(
+        "--all",
+        help="Document every family in fonts/, picking the best font for each",
+        action="store_true",
+    )
+    parser.add_argument(
+        "-j", "--jobs", help="Number of families to document at once", type=int
+    )
+    parser.add_argument(
+        "--force", help="Rewrite documentation even if unchanged", action="store_true"
     )
     args = parser.parse_args()
-    config = yaml.safe_load(open(args.config, "r"))
-    art_desc = FontDescription(args.font, config, noto=True)
+    configs = [yaml.safe_load(open(config, "r")) for config in args.config]
 
-    if args.font.parts[0] != "fonts":
-        print("Expected a path of the form fonts/NotoSansWhatever/...")
-    family_path = args.font.parts[1]
-
-    art_path = Path("documentation") / (family_path + ".article.html")
-    desc_path = Path("documentation") / (family_path + ".html")
-    art_desc.save(art_path, art_desc.art)
-    art_desc.save(desc_path, art_desc.desc)
+    if args.all:
+        if write_all_documentation(configs, jobs=args.jobs, force=args.force):
+            sys.exit(1)
+    elif args.font:
+        write_documentation(args.font, configs[0])
+    else:
+        parser.error("Either --font or --all is required")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,181 @@
+"""Read the bits of font metadata needed for documentation.
+
+Opening a font with fontTools and touching its layout tables decompiles the
+whole of GSUB and GPOS, which is slow and memory-hungry on big fonts. This
+reads the table directory, decompiles only cmap and name, and picks the
+few other fields it needs straight out of the binary data."""
+
+import struct
+from collections import namedtuple
+
+from fontTools.ttLib import TTFont
+
+Axis = namedtuple("Axis", ["axisTag", "minValue", "defaultValue", "maxValue", "axisNameID"])
+
+
+# The same order as fontTools' getBestCmap
+CMAP_PREFERENCES = [(3, 10), (0, 6), (0, 4), (3, 1), (0, 3), (0, 2), (0, 1), (0, 0)]
+
+
+def _fixed(value):
+    return value / 0x10000
+
+
+def _format_4_codepoints(data, offset):
+    # Like fontTools, skip the final 0xFFFF segment and anything which maps
+    # to .notdef.
+    (seg_count_x2,) = struct.unpack(">H", data[offset + 6 : offset + 8])
+    seg_count = seg_count_x2 // 2
+    ends_at = offset + 14
+    starts_at = ends_at + seg_count_x2 + 2
+    deltas_at = starts_at + seg_count_x2
+    range_offsets_at = deltas_at + seg_count_x2
+    ends = struct.unpack(f">{seg_count}H", data[ends_at : ends_at + seg_count_x2])
+    starts = struct.unpack(f">{seg_count}H", data[starts_at:deltas_at])
+    deltas = struct.unpack(f">{seg_count}h", data[deltas_at:range_offsets_at])
+    range_offsets = struct.unpack(
+        f">{seg_count}H", data[range_offsets_at : range_offsets_at + seg_count_x2]
+    )
+    codepoints = []
+    for i in range(seg_count - 1):
+        start, end, delta = starts[i], ends[i], deltas[i]
+        if range_offsets[i] == 0:
+            codepoints.extend(
+                cp for cp in range(start, end + 1) if (cp + delta) & 0xFFFF
+            )
+            continue
+        # idRangeOffset is relative to its own position in the table
+        base = range_offsets_at + i * 2 + range_offsets[i]
+        glyphs = struct.unpack(
+            f">{end - start + 1}H", data[base : base + (end - start + 1) * 2]
+        )
+        codepoints.extend(
+            cp
+            for cp, glyph in zip(range(start, end + 1), glyphs)
+            if glyph and (glyph + delta) & 0xFFFF
+        )
+    return codepoints
+
+
+def _format_12_codepoints(data, offset):
+    (groups,) = struct.unpack(">L", data[offset + 12 : offset + 16])
+    codepoints = []
+    for i in range(groups):
+        start = offset + 16 + i * 12
+        first, last, glyph = struct.unpack(">LLL", data[start : start + 12])
+        if glyph == 0:
+            # Only the first codepoint of the group maps to .notdef
+            first += 1
+        codepoints.extend(range(first, last + 1))
+    return codepoints
+
+
+class FontMetadata(object):
+    def __init__(self, path):
+        self.path = path
+        self._font = TTFont(path, lazy=True)
+        self._ttfont = None
+
+    def __contains__(self, tag):
+        return tag in self._font.reader
+
+    def table_data(self, tag):
+        """The raw binary data of a table"""
+        return self._font.reader[tag]
+
+    @property
+    def ttfont(self):
+        """A fully-loadable TTFont, for callers who need everything"""
+        if self._ttfont is None:
+            self._ttfont = TTFont(self.path)
+        return self._ttfont
+
+    @property
+    def name(self):
+        return self._font["name"]
+
+    def best_cmap(self):
+        return self._font.getBestCmap()
+
+    def codepoints(self):
+        """The codepoints in the best cmap subtable.
+
+        Formats 4 and 12 are read directly, which avoids decompiling cmap
+        into glyph names and so loading the glyph order from post."""
+        data = self.table_data("cmap")
+        (count,) = struct.unpack(">H", data[2:4])
+        subtables = {}
+        for i in range(count):
+            platform, encoding, offset = struct.unpack(
+                ">HHL", data[4 + i * 8 : 12 + i * 8]
+            )
+            subtables[(platform, encoding)] = offset
+        for key in CMAP_PREFERENCES:
+            if key not in subtables:
+                continue
+            offset = subtables[key]
+            (format,) = struct.unpack(">H", data[offset : offset + 2])
+            if format == 4:
+                return _format_4_codepoints(data, offset)
+            if format == 12:
+                return _format_12_codepoints(data, offset)
+            break
+        return sorted(self.best_cmap().keys())
+
+    @property
+    def num_glyphs(self):
+        return struct.unpack(">H", self.table_data("maxp")[4:6])[0]
+
+    def feature_tags(self, table_tag):
+        """Feature tags in a GSUB or GPOS FeatureList, lookups unread"""
+        if table_tag not in self:
+            return []
+        data = self.table_data(table_tag)
+        (feature_list,) = struct.unpack(">H", data[6:8])
+        if not feature_list:
+            return []
+        (count,) = struct.unpack(">H", data[feature_list : feature_list + 2])
+        records = feature_list + 2
+        return [
+            data[records + i * 6 : records + i * 6 + 4].decode("latin-1")
+            for i in range(count)
+        ]
+
+    def stat_axis_tags(self):
+        if "STAT" not in self:
+            return []
+        data = self.table_data("STAT")
+        axis_size, axis_count, axes_offset = struct.unpack(">HHL", data[4:12])
+        return [
+            data[axes_offset + i * axis_size : axes_offset + i * axis_size + 4].decode(
+                "latin-1"
+            )
+            for i in range(axis_count)
+        ]
+
+    def fvar_axes(self):
+        if "fvar" not in self:
+            return []
+        data = self.table_data("fvar")
+        axes_offset, _, axis_count, axis_size = struct.unpack(">HHHH", data[4:12])
+        axes = []
+        for i in range(axis_count):
+            start = axes_offset + i * axis_size
+            tag, minimum, default, maximum, _, name_id = struct.unpack(
+                ">4slllHH", data[start : start + 20]
+            )
+            axes.append(
+                Axis(
+                    tag.decode("latin-1"),
+                    _fixed(minimum),
+                    _fixed(default),
+                    _fixed(maximum),
+                    name_id,
+                )
+            )
+        return axes
+
+    def close(self):
+        self._font.close()
+        if self._ttfont is not None:
+            self._ttfont.close()
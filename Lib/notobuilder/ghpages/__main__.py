@@ -1,52 +1,180 @@
 from collections import defaultdict
+import argparse
+import hashlib
+import json
 import os
 import re
-from glob import glob
 from pathlib import Path
 from urllib.parse import quote
 from importlib.resources import files
 
 import chevron
-from fontTools.ttLib import TTFont
-from gftools.utils import font_sample_text
 from sh import git
 
+from notobuilder.fontinfo import FontMetadata
+from notocommon.timings import TIMINGS_DIR, write_summary
+from notocommon.tree import TreeIndex
+
 
 DIFFBROWSERS_PROOF_RE = r"^(.*)-diffbrowsers_(.*).html$"
 
-class FileTreeMaker(object):
-    def _recurse(self, parent_path, file_list, prefix, output_buf, level):
-        if len(file_list) == 0:
-            return
+def family_reports(basename, out):
+    """Find the QA reports for a family in the index of out/"""
+    fontspector = []
+    for result in sorted(out.glob(f"fontspector/*{basename}*html")):
+        result = result[4:]
+        if "unhinted" in result:
+            fontspector.append({"name": "Noto fonts, unhinted", "path": result})
+        elif "hinted" in result:
+            fontspector.append({"name": "Noto fonts, hinted", "path": result})
+        elif "googlefonts" in result:
+            fontspector.append({"name": "Google Fonts", "path": result})
+    fontspector = list(reversed(sorted(fontspector, key=lambda l: l["name"])))
+    diffenator = []
+    for result in sorted(out.glob(f"qa/{basename}/Diffenator/*/report.html")):
+        diffenator.append(
+            {
+                "name": "Diffenator report, " + Path(result).parent.stem,
+                "path": result[4:],
+            }
+        )
+    proofs = defaultdict(list)
+    for result in out.glob(f"proof/{basename}/*html"):
+        if m := re.match(DIFFBROWSERS_PROOF_RE, os.path.basename(result)):
+            style, prooftype = m[1], m[2]
+            proofs[prooftype].append(
+                {
+                    "name": style,
+                    "path": result[4:],
+                }
+            )
+    # Sort by style
+    for k, v in proofs.items():
+        proofs[k] = list(sorted(v, key=lambda l: l["name"]))
+    return {
+        "fontspector": fontspector,
+        "diffenator": diffenator,
+        "proofs": dict(proofs),
+    }
+
+
+class PageManifest(object):
+    """Rendered sections of the report page for each family.
+
+    A family's sections depend only on its name and the names of its
+    reports (the file tree itself is loaded by the page from a separate
+    JSON listing), so they are reused as long as a digest of those names
+    has not changed."""
+
+    def __init__(self, path, templates):
+        self.path = path
+        self.templates = templates
+        self.version = hashlib.sha256(
+            "\0".join(templates[k] for k in sorted(templates)).encode("utf-8")
+        ).hexdigest()
+        self.families = {}
+        self.samples = {}
+        self.rendered = 0
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    manifest = json.load(f)
+                if manifest.get("version") == self.version:
+                    self.families = manifest["families"]
+                    self.samples = manifest.get("samples", {})
+            except (ValueError, KeyError):
+                pass
+        self.current = {}
+        self.current_samples = {}
+
+    def section(self, family, out):
+        """Return the sections for a family, given the indexes of its fonts
+        directory and of out/"""
+        basename = os.path.basename(family.path)
+        fname = re.sub(r"([a-z])([A-Z])", r"\1 \2", basename)
+        reports = family_reports(basename, out)
+        digest = hashlib.sha256(
+            json.dumps([fname, reports], sort_keys=True).encode("utf-8")
+        ).hexdigest()
+
+        entry = self.families.get(basename)
+        if entry and entry["digest"] == digest:
+            sections = entry["sections"]
         else:
-            file_list.sort(key=lambda f: os.path.isfile(os.path.join(parent_path, f)))
-            for idx, sub_path in enumerate(file_list):
-                full_path = os.path.join(parent_path, sub_path)
-
-                if os.path.isdir(full_path):
-                    output_buf.append(f'<li class="li-{level}">{sub_path}<ul>')
-                    self._recurse(
-                        full_path,
-                        os.listdir(full_path),
-                        "",
-                        output_buf,
-                        level + 1,
-                    )
-                elif os.path.isfile(full_path):
-                    output_buf.append(f'<li><a href="{full_path}"> {sub_path}</a></li>')
-            output_buf.append("%s </ul>" % (prefix))
-
-    def make(self, root):
-        self.root = root
-        buf = ["<ul>"]
-        path_parts = self.root.rsplit(os.path.sep, 1)
-        self._recurse(self.root, os.listdir(self.root), "", buf, 0)
-
-        output_str = "\n".join(buf)
-        return output_str
-
-
-def main():
+            context = {"name": fname, "basename": basename}
+            context.update(reports)
+            sections = {
+                name: chevron.render(template, context)
+                for name, template in self.templates.items()
+            }
+            self.rendered += 1
+        self.current[basename] = {"digest": digest, "sections": sections}
+        return sections
+
+    def sample_text(self, path):
+        """Words from the UDHR and language samples which a font can set.
+
+        These depend only on the font's cmap, so they are cached by a hash
+        of the raw cmap table, and worked out from its codepoints without
+        decompiling anything."""
+        font = FontMetadata(path)
+        try:
+            cmap = font.table_data("cmap")
+            digest = hashlib.sha256(cmap).hexdigest()
+            if digest in self.samples:
+                words = self.samples[digest]
+            else:
+                from gftools.utils import font_sample_text
+
+                words = font_sample_text(CodepointFont(font.codepoints()))
+        finally:
+            font.close()
+        self.current_samples[digest] = words
+        return words
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(
+                {
+                    "version": self.version,
+                    "families": self.current,
+                    "samples": self.current_samples,
+                },
+                f,
+            )
+        os.replace(tmp, self.path)
+
+
+class CodepointFont(object):
+    """Just enough of a TTFont for font_sample_text, which only looks at
+    which codepoints are in the cmap"""
+
+    def __init__(self, codepoints):
+        self.codepoints = codepoints
+
+    def getBestCmap(self):
+        return dict.fromkeys(self.codepoints)
+
+
+def default_manifest_path():
+    cache = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache")
+    return os.path.join(cache, "notobuilder", "ghpages.json")
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Build the gh-pages report")
+    parser.add_argument(
+        "--manifest",
+        help="JSON file of previously rendered family sections",
+        default=default_manifest_path(),
+    )
+    parser.add_argument(
+        "--full", help="Render every family afresh", action="store_true"
+    )
+    args = parser.parse_args(args)
+
     commit = git("rev-parse", "--short", "HEAD")
     github_repo = os.environ.get("GITHUB_REPOSITORY", "")
     reponame = github_repo.split("/")[1]
@@ -57,64 +185,46 @@ def main():
     raw_url = "https://notofonts.github.io/" + reponame + "/badges"
     shields_url = "https://img.shields.io/endpoint?url=" + quote(raw_url, safe="")
 
+    templates = {
+        name: files("notobuilder.ghpages").joinpath(name + ".html").read_text()
+        for name in ("fonts", "reports")
+    }
+    manifest = PageManifest(args.manifest, templates)
+    if args.full:
+        manifest.families = {}
+
+    # Everything below is read from these two indexes
+    fonts = TreeIndex.scan("fonts")
+    out = TreeIndex.scan("out")
+
+    # The page only has a placeholder for each family's file tree; the
+    # tree itself is loaded from a JSON listing when it is opened.
+    os.makedirs("out/trees", exist_ok=True)
     families = []
-    for family in glob("fonts/*"):
-        basename = os.path.basename(family)
-        fname = re.sub(r"([a-z])([A-Z])", r"\1 \2", basename)
-        fonttree = FileTreeMaker().make(family)
-        fontspector = []
-        for result in glob(f"out/fontspector/*{basename}*html"):
-            result = result[4:]
-            if "unhinted" in result:
-                fontspector.append({"name": "Noto fonts, unhinted", "path": result})
-            elif "hinted" in result:
-                fontspector.append({"name": "Noto fonts, hinted", "path": result})
-            elif "googlefonts" in result:
-                fontspector.append({"name": "Google Fonts", "path": result})
-        fontspector = list(reversed(sorted(fontspector, key=lambda l: l["name"])))
-        diffenator = []
-        for result in glob(f"out/qa/{basename}/Diffenator/*/report.html"):
-            diffenator.append(
-                {
-                    "name": "Diffenator report, " + Path(result).parent.stem,
-                    "path": result[4:],
-                }
-            )
-        proofs = defaultdict(list)
-        for result in glob(f"out/proof/{basename}/*html"):
-            if m := re.match(DIFFBROWSERS_PROOF_RE, os.path.basename(result)):
-                style, prooftype = m[1], m[2]
-                proofs[prooftype].append(
-                    {
-                        "name": style,
-                        "path": result[4:],
-                    }
-                )
-        # Sort by style
-        for k, v in proofs.items():
-            proofs[k] = list(sorted(v, key=lambda l: l["name"]))
-        families.append(
-            {
-                "name": fname,
-                "fonttree": fonttree,
-                "fontspector": fontspector,
-                "diffenator": diffenator,
-                "proofs": proofs,
-            }
-        )
+    for family in fonts.directories.values():
+        families.append(manifest.section(family, out))
+        listing = os.path.join("out/trees", os.path.basename(family.path) + ".json")
+        with open(listing, "w") as f:
+            json.dump(family.listing(), f, separators=(",", ":"))
+    print(f"Rendered {manifest.rendered} of {len(families)} families")
 
+    # The QA stages may have run on different machines, so their timings
+    # are summarised again now that they are all in out/
+    timings = None
+    if out.glob("timings/*.jsonl"):
+        timings = os.path.relpath(write_summary(TIMINGS_DIR), "out")
 
-    unhinted = glob("fonts/*/unhinted/ttf/*.ttf")
+    unhinted = fonts.glob("*/unhinted/ttf/*.ttf")
     grab_a_font = None
     if unhinted:
         grab_a_font = unhinted[0]
 
     sample_text = ""
     if grab_a_font:
-        sample_text = font_sample_text(TTFont(grab_a_font))
+        sample_text = manifest.sample_text(grab_a_font)
         sample_text = " ".join(sample_text)
         sample_text += " " + sample_text
-
+    manifest.save()
 
     with open("README.md") as readme:
         lines = readme.read()
@@ -124,8 +234,6 @@ def main():
         else:
             project = m[1]
 
-    print(families)
-
     template = files('notobuilder.ghpages').joinpath('template.html').read_text()
 
     with open("out/index.html", "w") as fw:
@@ -140,6 +248,7 @@ def main():
                     "shields_url": shields_url,
                     "a_font": grab_a_font,
                     "sample_text": sample_text,
+                    "timings": timings,
                 },
             )
         )
@@ -0,0 +1,71 @@
+"""Limit how many memory-hungry build steps ninja runs at once.
+
+Compiling a big family with fontmake can take a couple of gigabytes, so
+letting ninja run one per core runs out of memory; but most steps (fixing,
+autohinting, renaming) are small and should run as wide as possible. Each
+operation is given a cost class, and the heavy and medium classes are put
+into ninja pools whose depths are worked out from the memory budget and
+the number of cores. Everything else runs at ninja's usual parallelism."""
+
+import os
+
+from ninja.ninja_syntax import Writer
+
+MB = 1024 * 1024
+
+# Rough peak memory of one step of each class
+COSTS = {"heavy": 2048 * MB, "medium": 512 * MB}
+
+# Keyed by ninja rule name, which is the operation's module name except for
+# buildStat, which has rules of its own
+COST_CLASSES = {
+    "addSubset": "heavy",
+    "buildOTF": "heavy",
+    "buildTTF": "heavy",
+    "buildVariable": "heavy",
+    "buildVTT": "heavy",
+    "fontcBuildOTF": "heavy",
+    "fontcBuildTTF": "heavy",
+    "fontcBuildVariable": "heavy",
+    "glyphs2ds": "heavy",
+    "instantiateUfo": "heavy",
+    "avar2ToAvar1": "medium",
+    "buildAvar2": "medium",
+    "buildFvarInstances": "medium",
+    "buildSTAT-operation": "medium",
+    "buildSTAT-postprocess": "medium",
+    "featureFreeze": "medium",
+    "genStatic": "medium",
+    "hbsubset": "medium",
+    "paintcompiler": "medium",
+    "remap": "medium",
+    "remapLayout": "medium",
+    "subspace": "medium",
+}
+
+
+def pool_depths(memory, cores=None):
+    """Work out how many steps of each cost class may run at once, given a
+    memory budget in bytes. The heavy steps get first call on the budget
+    and the medium steps share what is left; neither runs more steps than
+    there are cores, and both may always run at least one."""
+    cores = cores or os.cpu_count() or 1
+    depths = {}
+    for name in ["heavy", "medium"]:
+        depths[name] = max(1, min(cores, memory // COSTS[name]))
+        memory = max(0, memory - depths[name] * COSTS[name])
+    return depths
+
+
+class PooledWriter(Writer):
+    """A ninja writer which declares the pools up front and puts each rule
+    into the pool for its cost class"""
+
+    def __init__(self, output, depths, width=78):
+        super().__init__(output, width)
+        for name, depth in depths.items():
+            self.pool(name, depth)
+        self.newline()
+
+    def rule(self, name, command, pool=None, **kwargs):
+        super().rule(name, command, pool=pool or COST_CLASSES.get(name), **kwargs)
@@ -0,0 +1,224 @@
+"""Find out where the time goes in a build.
+
+The Python phases of the build (recipe generation, building the graph and
+writing the ninja file) are timed directly. The ninja build itself is
+profiled after the fact from .ninja_log, which records when each output
+was started and finished; the ninja file tells us which operation made each
+output, and following its outputs through to fonts/ tells us which family
+it was for."""
+
+import json
+import os
+import re
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from importlib.resources import files
+
+import chevron
+
+FAMILY_RE = re.compile(r"(?:^|/)fonts/([^/]+)/")
+
+
+def _unescape(token):
+    return re.sub(r"\$(.)", r"\1", token)
+
+
+def _tokens(line):
+    """Split a ninja build line on unescaped spaces, keeping ':' and '|'
+    separators as tokens of their own"""
+    tokens = []
+    current = ""
+    i = 0
+    while i < len(line):
+        c = line[i]
+        if c == "$" and i + 1 < len(line):
+            current += line[i : i + 2]
+            i += 2
+            continue
+        if c == " ":
+            if current:
+                tokens.append(current)
+            current = ""
+        elif c == ":":
+            if current:
+                tokens.append(current)
+            tokens.append(":")
+            current = ""
+        elif c == "|":
+            if current:
+                tokens.append(current)
+            if line[i : i + 2] == "||":
+                tokens.append("||")
+                i += 1
+            else:
+                tokens.append("|")
+            current = ""
+        else:
+            current += c
+        i += 1
+    if current:
+        tokens.append(current)
+    return [t if t in (":", "|", "||") else _unescape(t) for t in tokens]
+
+
+def ninja_edges(path):
+    """Return a list of (outputs, rule, inputs) for each build statement in
+    a ninja file. Implicit outputs and implicit and order-only inputs are
+    included."""
+    edges = []
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().split("\n")
+    statement = ""
+    for line in lines:
+        if line.endswith("$") and not line.endswith("$$"):
+            statement += line[:-1]
+            continue
+        statement += line
+        line, statement = statement, ""
+        if not line.startswith("build "):
+            continue
+        tokens = _tokens(line[len("build ") :])
+        if ":" not in tokens:
+            continue
+        colon = tokens.index(":")
+        outputs = [t for t in tokens[:colon] if t != "|"]
+        rule = tokens[colon + 1]
+        inputs = [t for t in tokens[colon + 2 :] if t not in ("|", "||")]
+        edges.append((outputs, rule, inputs))
+    return edges
+
+
+def ninja_log_position(path=".ninja_log"):
+    """Where the next build's entries will start in the ninja log"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_size)
+
+
+def read_ninja_log(path=".ninja_log", position=None):
+    """Return a dictionary mapping each output to its (start, end) times in
+    seconds, from the entries written since position. If ninja has
+    recompacted the log in the meantime (which replaces the file), the
+    whole log is read."""
+    entries = {}
+    if not os.path.exists(path):
+        return entries
+    with open(path, encoding="utf-8") as f:
+        if position and position[0] == os.fstat(f.fileno()).st_ino:
+            f.seek(position[1])
+        for line in f:
+            if line.startswith("#"):
+                continue
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 4:
+                continue
+            start, end, _, output = fields[:4]
+            # Later entries for an output supersede earlier ones
+            entries[output] = (int(start) / 1000, int(end) / 1000)
+    return entries
+
+
+def edge_families(edges):
+    """Work out which families each edge contributes to, by following its
+    outputs through the graph until they reach fonts/<family>/. Edges whose
+    outputs lead nowhere, such as the stamps of postprocessing steps, count
+    towards the families of the targets they depend on."""
+    consumers = defaultdict(list)
+    for index, (_, _, inputs) in enumerate(edges):
+        for input in inputs:
+            consumers[input].append(index)
+
+    families = []
+    for outputs, _, inputs in edges:
+        found = set()
+        seen = set(outputs)
+        queue = deque(outputs)
+        while queue:
+            path = queue.popleft()
+            if m := FAMILY_RE.search(path):
+                found.add(m[1])
+                continue
+            for index in consumers[path]:
+                for output in edges[index][0]:
+                    if output not in seen:
+                        seen.add(output)
+                        queue.append(output)
+        if not found:
+            found = {m[1] for input in inputs if (m := FAMILY_RE.search(input))}
+        families.append(sorted(found))
+    return families
+
+
+class BuildProfile(object):
+    def __init__(self):
+        self.phases = []
+
+    @contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append(
+                {"name": name, "seconds": round(time.perf_counter() - start, 3)}
+            )
+
+    def ninja_report(self, ninja_file, log_entries):
+        """Per-target, per-operation and per-family timings of a ninja build"""
+        edges = ninja_edges(ninja_file)
+        families = edge_families(edges)
+        targets = []
+        for (outputs, rule, _), edge_family in zip(edges, families):
+            times = [log_entries[o] for o in outputs if o in log_entries]
+            if not times:
+                continue  # Not rebuilt this time
+            start = min(t[0] for t in times)
+            end = max(t[1] for t in times)
+            targets.append(
+                {
+                    "outputs": outputs,
+                    "operation": rule,
+                    "families": edge_family,
+                    "start": start,
+                    "seconds": round(end - start, 3),
+                }
+            )
+        targets.sort(key=lambda t: t["seconds"], reverse=True)
+        return {
+            "targets": targets,
+            "operations": _totals(targets, lambda t: [t["operation"]]),
+            "families": _totals(targets, lambda t: t["families"] or ["(none)"]),
+        }
+
+    def write(self, prefix, ninja=None):
+        """Write prefix.json and prefix.html"""
+        report = {"phases": self.phases}
+        if ninja:
+            report.update(ninja)
+        with open(prefix + ".json", "w") as f:
+            json.dump(report, f, indent=1)
+        template = files("notobuilder").joinpath("templates/profile.html").read_text()
+        with open(prefix + ".html", "w") as f:
+            f.write(chevron.render(template, report))
+        print(f"Wrote build profile to {prefix}.json and {prefix}.html")
+
+
+def _totals(targets, keys):
+    totals = defaultdict(lambda: {"count": 0, "seconds": 0.0, "longest": 0.0})
+    for target in targets:
+        for key in keys(target):
+            total = totals[key]
+            total["count"] += 1
+            total["seconds"] += target["seconds"]
+            total["longest"] = max(total["longest"], target["seconds"])
+    return sorted(
+        (
+            {"name": name, **total, "seconds": round(total["seconds"], 3)}
+            for name, total in totals.items()
+        ),
+        key=lambda t: t["seconds"],
+        reverse=True,
+    )
@@ -0,0 +1,121 @@
+"""Compact range tables for the Unicode properties used in documentation.
+
+Looking up a codepoint with youseedee.ucd_data consults every file in the
+Unicode Character Database. For the few properties we need, we instead keep
+a sorted table of (start, end, value) ranges, built once from the UCD files
+and cached on disk next to them."""
+
+import json
+import os
+from bisect import bisect_right
+from functools import lru_cache
+from pathlib import Path
+
+# Property name: (UCD file, value for codepoints not listed)
+PROPERTIES = {
+    "Script": ("Scripts.txt", "Unknown"),
+    "Block": ("Blocks.txt", "No_Block"),
+    "General_Category": ("extracted/DerivedGeneralCategory.txt", "Cn"),
+}
+CACHE_FILE = "notobuilder-ranges.json"
+
+
+class RangeTable(object):
+    def __init__(self, starts, ends, values, default):
+        self.starts = starts
+        self.ends = ends
+        self.values = values
+        self.default = default
+
+    @classmethod
+    def from_ranges(cls, ranges, default):
+        starts, ends, values = [], [], []
+        for start, end, value in sorted(ranges):
+            # Merge adjacent ranges with the same value
+            if values and values[-1] == value and ends[-1] + 1 == start:
+                ends[-1] = end
+                continue
+            starts.append(start)
+            ends.append(end)
+            values.append(value)
+        return cls(starts, ends, values, default)
+
+    def __getitem__(self, codepoint):
+        i = bisect_right(self.starts, codepoint) - 1
+        if i >= 0 and codepoint <= self.ends[i]:
+            return self.values[i]
+        return self.default
+
+    def lookup_all(self, codepoints):
+        """Look up a sorted list of codepoints in one walk over the table"""
+        result = []
+        i = 0
+        count = len(self.starts)
+        for codepoint in codepoints:
+            while i < count and self.ends[i] < codepoint:
+                i += 1
+            if i < count and self.starts[i] <= codepoint:
+                result.append(self.values[i])
+            else:
+                result.append(self.default)
+        return result
+
+
+def _sources():
+    import youseedee
+
+    return {
+        prop: Path(youseedee.ucd_dir()) / filename
+        for prop, (filename, _) in PROPERTIES.items()
+    }
+
+
+def _build():
+    import youseedee
+
+    tables = {}
+    for prop, (filename, default) in PROPERTIES.items():
+        ranges = youseedee.parse_file_ranges(filename)
+        tables[prop] = RangeTable.from_ranges(ranges, default)
+    return tables
+
+
+@lru_cache(maxsize=None)
+def ucd_ranges():
+    """Return a dictionary of RangeTables, keyed by property name"""
+    import youseedee
+
+    cache_path = Path(youseedee.ucd_dir()) / CACHE_FILE
+    stamps = {
+        prop: os.path.getmtime(path) if path.exists() else None
+        for prop, path in _sources().items()
+    }
+    if cache_path.exists():
+        try:
+            with open(cache_path) as f:
+                cached = json.load(f)
+            if cached["stamps"] == stamps:
+                return {
+                    prop: RangeTable(*cached["tables"][prop], PROPERTIES[prop][1])
+                    for prop in PROPERTIES
+                }
+        except (OSError, ValueError, KeyError):
+            pass
+
+    tables = _build()
+    # Parsing may have downloaded the files, so stamp them afresh
+    stamps = {prop: os.path.getmtime(path) for prop, path in _sources().items()}
+    tmp = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp, "w") as f:
+        json.dump(
+            {
+                "stamps": stamps,
+                "tables": {
+                    prop: [table.starts, table.ends, table.values]
+                    for prop, table in tables.items()
+                },
+            },
+            f,
+        )
+    os.replace(tmp, cache_path)
+    return tables
@@ -0,0 +1,2 @@
+"""Helpers shared by the build (notobuilder) and QA (notoqa) packages, kept
+here so that neither package has to import the other."""
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+def default_cache_dir():
+    return os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "notoqa"
+    )
+
+
+def sha256_fileobj(f):
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: f.read(1 << 20), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentCache(object):
+    """A size-limited, content-addressed store of immutable blobs.
+
+    Blobs are stored under their SHA-256 digest, and an index maps keys
+    (such as release asset URLs) to digests, so keys with identical content
+    share one copy. The digest is checked whenever a blob is handed out;
+    a corrupted blob is dropped and treated as a miss. When the store grows
+    beyond max_size bytes, the least recently used blobs are evicted.
+
+    The store may be shared by several threads and processes. Every change
+    to it is made under a lock file as well as a thread lock, and blobs are
+    handed out as open files, so a blob evicted by someone else after it
+    has been handed out can still be read to the end."""
+
+    def __init__(self, root, max_size=2 * 1024**3):
+        self.root = root
+        self.max_size = max_size
+        self.index_path = os.path.join(root, "index.json")
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        with self._lock, open(os.path.join(self.root, "lock"), "a") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], digest)
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"keys": {}, "objects": {}}
+
+    def _save_index(self, index):
+        tmp = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp, self.index_path)
+
+    def open(self, key):
+        """Return the blob stored under key as a binary file opened for
+        reading, or None. The caller closes it."""
+        with self._locked():
+            index = self._load_index()
+            digest = index["keys"].get(key)
+            if not digest:
+                return None
+            try:
+                blob = open(self._object_path(digest), "rb")
+            except OSError:
+                blob = None
+            if blob is None or sha256_fileobj(blob) != digest:
+                if blob is not None:
+                    blob.close()
+                self._remove(index, digest)
+                self._save_index(index)
+                return None
+            blob.seek(0)
+            index["objects"][digest]["last_used"] = time.time()
+            self._save_index(index)
+            return blob
+
+    def put(self, key, data):
+        """Store bytes under key"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        with self._locked():
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+            index = self._load_index()
+            index["keys"][key] = digest
+            index["objects"][digest] = {"size": len(data), "last_used": time.time()}
+            self._evict(index, keep=digest)
+            self._save_index(index)
+
+    def _remove(self, index, digest):
+        index["objects"].pop(digest, None)
+        for key in [k for k, d in index["keys"].items() if d == digest]:
+            del index["keys"][key]
+        try:
+            os.remove(self._object_path(digest))
+        except OSError:
+            # Already gone, or (on Windows) still open
+            pass
+
+    def _evict(self, index, keep=None):
+        objects = index["objects"]
+        total = sum(o["size"] for o in objects.values())
+        for digest in sorted(objects, key=lambda d: objects[d]["last_used"]):
+            if total <= self.max_size:
+                break
+            if digest == keep:
+                continue
+            total -= objects[digest]["size"]
+            self._remove(index, digest)
@@ -0,0 +1,21 @@
+import os
+
+
+def default_memory():
+    """Three quarters of the machine's physical memory, in bytes, or None
+    if we cannot tell"""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") * 3 // 4
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def add_memory_argument(parser):
+    memory = default_memory()
+    parser.add_argument(
+        "--max-memory",
+        type=int,
+        default=memory // (1024 * 1024) if memory else None,
+        help="Memory budget for concurrent jobs in megabytes "
+        "(default: three quarters of physical memory)",
+    )
@@ -0,0 +1,111 @@
+"""The summary page of the QA stages' timings, written from the event logs
+in out/timings/ (see notoqa.instrument). The report pages link to it."""
+import glob
+import json
+import os
+from collections import defaultdict
+from html import escape
+
+TIMINGS_DIR = os.path.join("out", "timings")
+
+
+def read_events(directory=TIMINGS_DIR):
+    events = []
+    for path in sorted(glob.glob(os.path.join(directory, "*.jsonl"))):
+        with open(path) as f:
+            events.extend(json.loads(line) for line in f if line.strip())
+    return events
+
+
+def _table(headings, rows):
+    html = ["<table>", "<tr>" + "".join(f"<th>{h}</th>" for h in headings) + "</tr>"]
+    for row in rows:
+        cells = "".join(f"<td>{escape(str(cell))}</td>" for cell in row)
+        html.append(f"<tr>{cells}</tr>")
+    html.append("</table>")
+    return "\n".join(html)
+
+
+def _seconds(seconds):
+    return f"{seconds:.1f}s"
+
+
+def _mb(size):
+    return f"{size / 1024 / 1024:.0f}MB" if size else ""
+
+
+def write_summary(directory=TIMINGS_DIR, slowest=25):
+    """Tabulate the stages, the tools they ran and their slowest steps"""
+    events = read_events(directory)
+    stages = [e for e in events if e["kind"] == "stage"]
+    steps = [e for e in events if e["kind"] != "stage"]
+
+    tools = defaultdict(
+        lambda: {"runs": 0, "failed": 0, "wall": 0.0, "cpu": 0.0, "max_rss": 0}
+    )
+    for step in steps:
+        tool = tools[(step["stage"], step.get("tool", step["kind"]))]
+        tool["runs"] += 1
+        tool["failed"] += bool(step.get("status"))
+        tool["wall"] += step.get("wall", 0.0)
+        tool["cpu"] += step.get("cpu", 0.0)
+        tool["max_rss"] = max(tool["max_rss"], step.get("max_rss", 0))
+    tools = sorted(tools.items(), key=lambda item: item[1]["wall"], reverse=True)
+    steps.sort(key=lambda e: e.get("wall", 0), reverse=True)
+
+    html = [
+        "<!DOCTYPE html>",
+        '<html><head><meta charset="utf-8" /><title>QA timings</title></head><body>',
+        "<h1>QA timings</h1>",
+        "<h2>Stages</h2>",
+        _table(
+            ["Stage", "Wall", "CPU", "Peak memory", "Status"],
+            [
+                (
+                    s["stage"],
+                    _seconds(s["wall"]),
+                    _seconds(s["total_cpu"]),
+                    _mb(s["peak_rss"]),
+                    s["status"],
+                )
+                for s in stages
+            ],
+        ),
+        "<h2>Tools</h2>",
+        _table(
+            ["Stage", "Tool", "Runs", "Failed", "Wall", "CPU", "Peak memory"],
+            [
+                (
+                    stage,
+                    tool,
+                    t["runs"],
+                    t["failed"],
+                    _seconds(t["wall"]),
+                    _seconds(t["cpu"]),
+                    _mb(t["max_rss"]),
+                )
+                for (stage, tool), t in tools
+            ],
+        ),
+        "<h2>Slowest steps</h2>",
+        _table(
+            ["Stage", "Step", "Label", "Wall", "CPU", "Peak memory", "Status"],
+            [
+                (
+                    e["stage"],
+                    e.get("tool", e["kind"]),
+                    e["label"],
+                    _seconds(e.get("wall", 0)),
+                    _seconds(e.get("cpu", 0)),
+                    _mb(e.get("max_rss")),
+                    e["status"],
+                )
+                for e in steps[:slowest]
+            ],
+        ),
+        "</body></html>",
+    ]
+    path = os.path.join(directory, "summary.html")
+    with open(path, "w") as f:
+        f.write("\n".join(html))
+    return path
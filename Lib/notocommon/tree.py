@@ -0,0 +1,73 @@
+"""An in-memory index of a directory tree, read with a single os.scandir walk.
+
+Everything the report page needs to know about fonts/ and out/ (the file
+tree listings, and the lookups which used to be globs) is answered from the
+index without touching the filesystem again."""
+
+import os
+from fnmatch import fnmatchcase
+
+
+class TreeIndex(object):
+    def __init__(self, path, directories=None, files=None):
+        self.path = path
+        self.directories = directories or {}
+        self.files = files or []
+
+    @classmethod
+    def scan(cls, path):
+        """Read the tree under path. A missing path gives an empty index."""
+        node = cls(path)
+        try:
+            entries = sorted(os.scandir(path), key=lambda e: e.name)
+        except (FileNotFoundError, NotADirectoryError):
+            return node
+        for entry in entries:
+            # DirEntry already knows the type of most entries, so this only
+            # stats symlinks and the like.
+            if entry.is_dir():
+                node.directories[entry.name] = cls.scan(entry.path)
+            elif entry.is_file():
+                node.files.append(entry.name)
+        return node
+
+    def __getitem__(self, relative):
+        """The index of a subdirectory, given as a path relative to this one.
+        Missing directories give an empty index."""
+        node = self
+        for part in relative.split("/"):
+            node = node.directories.get(part)
+            if node is None:
+                return TreeIndex(os.path.join(self.path, relative))
+        return node
+
+    def glob(self, pattern):
+        """Paths matching a glob pattern relative to this directory. Like
+        glob.glob, wildcards do not match names starting with a dot."""
+        head, _, rest = pattern.partition("/")
+        if not rest:
+            return [
+                os.path.join(self.path, name)
+                for name in sorted(self.directories.keys() | set(self.files))
+                if _match(name, head)
+            ]
+        return [
+            path
+            for name, child in self.directories.items()
+            if _match(name, head)
+            for path in child.glob(rest)
+        ]
+
+    def listing(self):
+        """A compact, JSON-serializable listing of the tree: a list of
+        [name, listing] pairs for the subdirectories, then a list of files"""
+        return [
+            [[name, child.listing()] for name, child in self.directories.items()],
+            self.files,
+        ]
+
+
+def _match(name, pattern):
+    if name.startswith(".") and not pattern.startswith("."):
+        return False
+    return fnmatchcase(name, pattern)
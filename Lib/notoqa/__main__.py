@@ -1,15 +1,20 @@
-from glob import glob
+from concurrent.futures import as_completed
+import argparse
 import os
 import sys
-import subprocess
 
-exit_status = 0
+from notoqa.instrument import EventLog
+from notoqa.inventory import FontInventory, largest_first
+from notoqa.jobs import (
+    Scheduler,
+    add_jobs_argument,
+    estimate_memory,
+    log,
+    run_command,
+)
 
-os.makedirs("out/fontspector", exist_ok=True)
-families = [os.path.basename(x) for x in glob("fonts/*")]
 
-
-def do_one_run(profile, output, inputs):
+def do_one_run(profile, output, inputs, events=None):
     if not inputs:
         return 0
     config = []
@@ -31,30 +36,75 @@ def do_one_run(profile, output, inputs):
         f"out/fontspector/notofonts-{output}-report.md",
         *inputs,
     ]
-    args = " ".join(args)
-    return subprocess.run(
-        args,
-        shell=True,
-    ).returncode
-
+    return run_command(args, output, events)
 
-def run_fontspector(family):
-    local_exit_status = 0
-    #unhinted_outputs = glob(f"fonts/{family}/unhinted/ttf/*.ttf")
-    #hinted_outputs = glob(f"fonts/{family}/hinted/ttf/*.ttf")
 
-    gf_outputs = glob(f"fonts/{family}/googlefonts/variable-ttf/*.ttf")
+def family_fonts(inventory, family):
+    gf_outputs = inventory.fonts(family, "googlefonts/variable-ttf")
     if not gf_outputs:
-        gf_outputs = glob(f"fonts/{family}/googlefonts/ttf/*.ttf")
+        gf_outputs = inventory.fonts(family, "googlefonts/ttf")
+    return gf_outputs
+
+
+def run_fontspector(family, gf_outputs, events=None):
+    local_exit_status = 0
+    #unhinted_outputs = inventory.fonts(family, "unhinted/ttf")
+    #hinted_outputs = inventory.fonts(family, "hinted/ttf")
 
     #local_exit_status |= do_one_run("notofonts", f"{family}-unhinted", unhinted_outputs)
     #local_exit_status |= do_one_run("notofonts", f"{family}-hinted", hinted_outputs)
 
-    local_exit_status |= do_one_run("googlefonts", f"{family}-googlefonts", gf_outputs)
+    local_exit_status |= do_one_run(
+        "googlefonts", f"{family}-googlefonts", gf_outputs, events
+    )
     return local_exit_status
 
 
-for family in families:
-    exit_status |= run_fontspector(family)
+class FontspectorStage(object):
+    name = "fontspector"
+
+    def start(self, inventory, scheduler):
+        os.makedirs("out/fontspector", exist_ok=True)
+        self.events = EventLog(self.name)
+        self.futures = {}
+        families = largest_first(
+            inventory.families, lambda f: family_fonts(inventory, f)
+        )
+        for family in families:
+            fonts = family_fonts(inventory, family)
+            future = scheduler.submit(
+                run_fontspector,
+                family,
+                fonts,
+                self.events,
+                memory=estimate_memory(fonts),
+            )
+            self.futures[future] = family
+
+    def finish(self):
+        exit_status = 0
+        for future in as_completed(self.futures):
+            family = self.futures[future]
+            try:
+                status = future.result()
+            except Exception as e:
+                log(family, f"fontspector run failed: {e}")
+                status = 1
+            exit_status |= status
+        self.events.close(exit_status)
+        return exit_status
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Run fontspector on all families")
+    add_jobs_argument(parser)
+    args = parser.parse_args(args)
+
+    stage = FontspectorStage()
+    with Scheduler(args.jobs) as scheduler:
+        stage.start(FontInventory(), scheduler)
+        return stage.finish()
+
 
-sys.exit(exit_status)
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+import hashlib
+import json
+import os
+import threading
+
+from fontTools.ttLib import TTFont
+
+# Tables which change on every build without the font itself changing
+IGNORED_TABLES = {"DSIG"}
+# Byte ranges within the head table holding checkSumAdjustment and modified
+HEAD_NOISE = [(8, 12), (28, 36)]
+# Byte range within the head table holding fontRevision, and the name IDs
+# (unique ID and version string) which carry the version, for comparisons
+# which should not count a new version number as a change
+HEAD_VERSION = (4, 8)
+VERSION_NAME_IDS = {3, 5}
+
+
+def _name_data(font):
+    """The name table's records other than those carrying the version"""
+    records = sorted(
+        (r.platformID, r.platEncID, r.langID, r.nameID, r.toBytes())
+        for r in font["name"].names
+        if r.nameID not in VERSION_NAME_IDS
+    )
+    return repr(records).encode("utf-8")
+
+
+def fingerprint(path, ignore_version=False):
+    """Return a dictionary mapping each table tag in a font to a hash of
+    its binary data. Tables are read raw, without being decompiled, and
+    the build-time noise in head is blanked out first. With
+    ignore_version, so is head's fontRevision, and the name table is
+    hashed without its version records."""
+    font = TTFont(path, lazy=True)
+    try:
+        tables = {}
+        for tag in sorted(font.reader.keys()):
+            if tag in IGNORED_TABLES:
+                continue
+            data = font.reader[tag]
+            if tag == "head":
+                noise = HEAD_NOISE + ([HEAD_VERSION] if ignore_version else [])
+                data = bytearray(data)
+                for start, end in noise:
+                    data[start:end] = bytes(end - start)
+            elif tag == "name" and ignore_version:
+                data = _name_data(font)
+            tables[tag] = hashlib.sha256(data).hexdigest()
+        return tables
+    finally:
+        font.close()
+
+
+def unchanged(before, after):
+    """Do two fingerprints agree?"""
+    if before is None or after is None:
+        return False
+    return before == after
+
+
+def no_change_report(path, before, after):
+    """Write a stub HTML report for a pair of fonts which were not compared"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write(
+            f"<p>No changes: {os.path.basename(after)} is identical to "
+            f"{os.path.basename(before)} apart from its version number "
+            "(fontRevision in head and name IDs 3 and 5), its modification "
+            "time and checksums, and its DSIG table.</p>"
+        )
+
+
+class FingerprintManifest(object):
+    """Fingerprints of fonts, kept as JSON next to the outputs made from them"""
+
+    def __init__(self, path):
+        self.path = path
+        self.fonts = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            try:
+                with open(path) as f:
+                    self.fonts = json.load(f)
+            except ValueError:
+                pass
+
+    def get(self, font):
+        with self._lock:
+            return self.fonts.get(font)
+
+    def set(self, font, tables):
+        with self._lock:
+            self.fonts[font] = tables
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with self._lock:
+            with open(self.path, "w") as f:
+                json.dump(self.fonts, f, indent=1, sort_keys=True)
@@ -0,0 +1,101 @@
+"""Timings and resource use of the QA stages.
+
+Each stage keeps an event log of the external tools it runs (wall time,
+CPU time and peak memory of the child process, and its exit status) and of
+its other slow steps such as downloads, and finally of the stage as a
+whole. The logs are JSON lines in out/timings/<stage>.jsonl, one file per
+stage so that the outputs of stages run on different machines can be
+merged, and summary.html tabulates whichever logs are there."""
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from notocommon.timings import TIMINGS_DIR, write_summary
+
+
+def wait_with_usage(proc):
+    """Wait for a subprocess, returning its exit status and its resource
+    usage (None on platforms without wait4)"""
+    if not hasattr(os, "wait4"):
+        return proc.wait(), None
+    _, status, usage = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    return proc.returncode, usage
+
+
+def max_rss(usage):
+    """Peak resident set size in bytes; Linux counts it in kilobytes.
+
+    The kernel counts the memory a child had before it exec'd the tool, so
+    this is never less than the size of the QA process which started it;
+    it is the tools' peaks well above that which are worth looking at."""
+    return usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+
+
+class EventLog(object):
+    """The event log of one stage. Events may be recorded from any thread."""
+
+    def __init__(self, stage, directory=TIMINGS_DIR):
+        self.stage = stage
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._file = open(os.path.join(directory, stage + ".jsonl"), "w")
+        self._lock = threading.Lock()
+        self.cpu = 0.0
+        self.max_rss = 0
+        self.start = time.monotonic()
+
+    def record(self, kind, label, **fields):
+        event = {"stage": self.stage, "kind": kind, "label": label, **fields}
+        with self._lock:
+            self.cpu += event.get("cpu", 0.0)
+            self.max_rss = max(self.max_rss, event.get("max_rss", 0))
+            self._file.write(json.dumps(event) + "\n")
+            self._file.flush()
+
+    def command(self, args, label, wall, usage, status):
+        fields = {"tool": os.path.basename(args[0]), "wall": round(wall, 3)}
+        if usage is not None:
+            fields["cpu"] = round(usage.ru_utime + usage.ru_stime, 3)
+            fields["max_rss"] = max_rss(usage)
+        self.record("command", label, status=status, **fields)
+
+    @contextmanager
+    def timed(self, kind, label, **fields):
+        """Record the wall time and this thread's CPU time of a block"""
+        start, cpu = time.monotonic(), time.thread_time()
+        status = 1
+        try:
+            yield
+            status = 0
+        finally:
+            self.record(
+                kind,
+                label,
+                status=status,
+                wall=round(time.monotonic() - start, 3),
+                cpu=round(time.thread_time() - cpu, 3),
+                **fields,
+            )
+
+    def close(self, status):
+        """Record the stage itself and update the summary. The stage's CPU
+        time and peak memory are the total and maximum of its events."""
+        wall = time.monotonic() - self.start
+        self.record(
+            "stage",
+            self.stage,
+            status=status,
+            wall=round(wall, 3),
+            total_cpu=round(self.cpu, 3),
+            peak_rss=self.max_rss,
+        )
+        self._file.close()
+        print(
+            f"{self.stage}: {wall:.1f}s wall, {self.cpu:.1f}s CPU, "
+            f"peak {self.max_rss / 1024 / 1024:.0f}MB"
+        )
+        write_summary(self.directory)
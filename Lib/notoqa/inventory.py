@@ -0,0 +1,36 @@
+import os
+
+from notocommon.tree import TreeIndex
+
+
+class FontInventory(object):
+    """The families and fonts in fonts/, found with a single walk of the
+    tree and shared by all the QA stages"""
+
+    def __init__(self, root="fonts"):
+        self.index = TreeIndex.scan(root)
+
+    @property
+    def families(self):
+        return list(self.index.directories)
+
+    def fonts(self, family, kind):
+        """The TTFs of a family in one of its directories, such as
+        "unhinted/ttf" or "googlefonts/variable-ttf" """
+        return self.index.glob(f"{family}/{kind}/*.ttf")
+
+
+def largest_first(items, fonts):
+    """Sort work so that the jobs on the biggest fonts start first, which
+    keeps the longest job from being the last one to begin"""
+
+    def size(item):
+        total = 0
+        for font in fonts(item):
+            try:
+                total += os.path.getsize(font)
+            except OSError:
+                pass
+        return total
+
+    return sorted(items, key=size, reverse=True)
@@ -0,0 +1,112 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from notoqa.instrument import wait_with_usage
+
+_print_lock = threading.Lock()
+
+
+def default_jobs():
+    return os.cpu_count() or 1
+
+
+def add_jobs_argument(parser):
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=default_jobs(),
+        help="Number of jobs to run concurrently (default: number of CPUs)",
+    )
+
+
+def estimate_memory(fonts):
+    """A rough guess at the peak memory, in bytes, of a tool working on
+    some fonts: a fixed overhead plus a multiple of their size on disk"""
+    size = 0
+    for font in fonts:
+        try:
+            size += os.path.getsize(font)
+        except OSError:
+            pass
+    return 256 * 1024 * 1024 + 16 * size
+
+
+def log(prefix, message):
+    with _print_lock:
+        print(f"[{prefix}] {message}", flush=True)
+
+
+def run_command(args, prefix, events=None):
+    """Run an external tool, streaming its output with a prefix on each line.
+
+    Returns the exit status of the process; a tool which cannot be started
+    is reported as 127, as a shell would. If an event log is given, the
+    run's timings and resource use are recorded in it."""
+    start = time.monotonic()
+    try:
+        proc = subprocess.Popen(
+            args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors="replace",
+        )
+    except OSError as e:
+        log(prefix, f"Could not run {args[0]}: {e}")
+        if events is not None:
+            events.command(args, prefix, time.monotonic() - start, None, 127)
+        return 127
+    for line in proc.stdout:
+        with _print_lock:
+            sys.stdout.write(f"[{prefix}] {line}")
+            sys.stdout.flush()
+    returncode, usage = wait_with_usage(proc)
+    if events is not None:
+        events.command(args, prefix, time.monotonic() - start, usage, returncode)
+    return returncode
+
+
+class Scheduler(object):
+    """A pool of workers which may be shared between several QA stages.
+
+    At most `jobs` jobs run at once, and if a memory budget (in bytes) is
+    given, a job only starts when its estimated memory fits alongside the
+    jobs already running. A job estimated to need more than the whole
+    budget runs once it has the machine to itself."""
+
+    def __init__(self, jobs, memory=None):
+        self.pool = ThreadPoolExecutor(max_workers=max(1, jobs))
+        self.memory = memory
+        self.in_use = 0
+        self._condition = threading.Condition()
+
+    def submit(self, func, *args, memory=0, **kwargs):
+        return self.pool.submit(self._run, func, args, kwargs, memory)
+
+    def _run(self, func, args, kwargs, memory):
+        if not self.memory:
+            return func(*args, **kwargs)
+        memory = min(memory, self.memory)
+        with self._condition:
+            self._condition.wait_for(lambda: self.in_use + memory <= self.memory)
+            self.in_use += memory
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._condition:
+                self.in_use -= memory
+                self._condition.notify_all()
+
+    def shutdown(self):
+        self.pool.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shutdown()
@@ -1,7 +1,21 @@
+from concurrent.futures import as_completed
 from pathlib import Path
+import argparse
 import glob
 import os
-import subprocess
+import sys
+import time
+
+from notoqa.fingerprint import FingerprintManifest, fingerprint, unchanged
+from notoqa.instrument import EventLog
+from notoqa.inventory import FontInventory, largest_first
+from notoqa.jobs import (
+    Scheduler,
+    add_jobs_argument,
+    estimate_memory,
+    log,
+    run_command,
+)
 
 
 def build_index_page(fp):
@@ -21,32 +35,115 @@ def build_index_page(fp):
         doc.write("\n".join(a_hrefs))
 
 
-outdir = os.path.join("out", "proof")
-os.makedirs(outdir, exist_ok=True)
-
-for family in [os.path.basename(x) for x in glob.glob("fonts/*")]:
-    fonts_now = glob.glob(f"fonts/{family}/unhinted/ttf/*.ttf")
-    variables_now = glob.glob(f"fonts/{family}/unhinted/variable-ttf/*.ttf")
-    if variables_now:
-        # Save time, just compare the variables
-        fonts_now = variables_now
-
-    for f in fonts_now:
-        dirname = os.path.join(outdir, family)
-        if len(fonts_now) > 1:
-            # If there are multiple fonts, put them in a subdir named after the family
-            os.makedirs(dirname, exist_ok=True)
-            dirname = os.path.join(dirname, Path(f).stem)
-        subprocess.run(
-            [
-                "diff3proof",
-                f,
-                "--output",
-                dirname,
-                # user_wordlist=all_strings)
-            ],
-            check=True,
+def proof_jobs(outdir, inventory):
+    """Return a list of (family, font, output directory) proofs to make"""
+    jobs = []
+    for family in inventory.families:
+        fonts_now = inventory.fonts(family, "unhinted/ttf")
+        variables_now = inventory.fonts(family, "unhinted/variable-ttf")
+        if variables_now:
+            # Save time, just compare the variables
+            fonts_now = variables_now
+
+        for f in fonts_now:
+            dirname = os.path.join(outdir, family)
+            if len(fonts_now) > 1:
+                # If there are multiple fonts, put them in a subdir named after the family
+                os.makedirs(dirname, exist_ok=True)
+                dirname = os.path.join(dirname, Path(f).stem)
+            jobs.append((family, f, dirname))
+    return jobs
+
+
+def run_proof(job, manifest, events=None):
+    family, font, dirname = job
+    start = time.monotonic()
+    tables = fingerprint(font)
+    if unchanged(manifest.get(font), tables) and glob.glob(dirname + "/*.html"):
+        log(Path(font).stem, "No change since the last proof, skipping")
+        if events is not None:
+            events.record("skipped", Path(font).stem, status=0)
+        return 0, time.monotonic() - start
+    returncode = run_command(
+        [
+            "diff3proof",
+            font,
+            "--output",
+            dirname,
+            # user_wordlist=all_strings)
+        ],
+        Path(font).stem,
+        events,
+    )
+    if returncode == 0:
+        manifest.set(font, tables)
+    return returncode, time.monotonic() - start
+
+
+class ProofStage(object):
+    name = "proof"
+
+    def start(self, inventory, scheduler):
+        self.outdir = os.path.join("out", "proof")
+        os.makedirs(self.outdir, exist_ok=True)
+        self.manifest = FingerprintManifest(
+            os.path.join(self.outdir, "fingerprints.json")
         )
+        self.events = EventLog(self.name)
+        jobs = largest_first(proof_jobs(self.outdir, inventory), lambda j: [j[1]])
+        self.futures = {
+            scheduler.submit(
+                run_proof,
+                job,
+                self.manifest,
+                self.events,
+                memory=estimate_memory([job[1]]),
+            ): job
+            for job in jobs
+        }
+
+    def finish(self):
+        timings = []
+        failures = []
+        for future in as_completed(self.futures):
+            family, font, _ = self.futures[future]
+            try:
+                returncode, elapsed = future.result()
+            except Exception as e:
+                log(family, f"{font}: {e}")
+                failures.append(font)
+                continue
+            timings.append((elapsed, font))
+            if returncode:
+                failures.append(font)
+
+        self.manifest.save()
+        # The fingerprint manifest lives here too, so look for the reports
+        if glob.glob(self.outdir + "/**/*.html", recursive=True):
+            build_index_page(self.outdir)
+
+        log(self.name, "Proof timings:")
+        for elapsed, font in sorted(timings, reverse=True):
+            log(self.name, f" * {font}: {elapsed:.1f}s")
+        self.events.close(1 if failures else 0)
+        if failures:
+            log(self.name, f"{len(failures)} proof(s) failed:")
+            for font in sorted(failures):
+                log(self.name, " * " + font)
+            return 1
+        return 0
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Make proof documents for all fonts")
+    add_jobs_argument(parser)
+    args = parser.parse_args(args)
+
+    stage = ProofStage()
+    with Scheduler(args.jobs) as scheduler:
+        stage.start(FontInventory(), scheduler)
+        return stage.finish()
+
 
-if glob.glob(outdir + "/*"):
-    build_index_page(outdir)
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,12 +1,33 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+import argparse
 import glob
+import io
 import os
-import re
 import shutil
-import subprocess
+import sys
+import threading
+import zipfile
 
-from gftools.utils import download_files_from_archive
-from github import Github
+from gftools.utils import download_file
+
+from notocommon.cache import ContentCache, default_cache_dir
+from notoqa.fingerprint import (
+    FingerprintManifest,
+    fingerprint,
+    no_change_report,
+    unchanged,
+)
+from notoqa.instrument import EventLog
+from notoqa.inventory import FontInventory
+from notoqa.jobs import (
+    Scheduler,
+    add_jobs_argument,
+    estimate_memory,
+    log,
+    run_command,
+)
+from notoqa.releases import ReleaseIndex, origin_repo
 
 
 def build_index_page(fp):
@@ -26,131 +47,333 @@ def build_index_page(fp):
         doc.write("\n".join(a_hrefs))
 
 
-def get_latest_release(family, user=None, repo=None):
+_release_indexes = {}
+_release_indexes_lock = threading.Lock()
+
+
+def get_latest_release(family, user=None, repo=None, cache_dir=None):
     if not (user and repo):
-        repo_url = (
-            subprocess.check_output(["git", "remote", "get-url", "origin"])
-            .decode("utf8")
-            .strip()
+        user, repo = origin_repo()
+
+    # Only walk the repository's releases once per run
+    with _release_indexes_lock:
+        if (user, repo) not in _release_indexes:
+            _release_indexes[(user, repo)] = ReleaseIndex(
+                user, repo, os.environ.get("GITHUB_TOKEN"), cache_dir
+            ).load()
+        return _release_indexes[(user, repo)].latest(family)
+
+
+_archive_locks = {}
+_archive_locks_lock = threading.Lock()
+
+
+def previous_release_archive(url, archive_cache, events):
+    """Return a release archive as an open binary file, downloading it
+    first if it is not in the cache. Released assets never change, so once
+    an archive is in the cache it is reused by every family and every later
+    run."""
+    with _archive_locks_lock:
+        lock = _archive_locks.setdefault(url, threading.Lock())
+    with lock:
+        archive = archive_cache.open(url)
+        if archive is None:
+            with events.timed("download", url):
+                data = download_file(url).getvalue()
+            archive_cache.put(url, data)
+            archive = io.BytesIO(data)
+    return archive
+
+
+def fetch_previous_fonts(
+    family, outdir, inventory, archive_cache, events, release_cache=None
+):
+    """Download the previous release of a family and work out which pairs
+    of fonts to compare.
+
+    Returns the directory the release was unpacked into and a list of
+    (before, now, report name) tuples, or None if there is nothing to do."""
+    with events.timed("releases", family):
+        previous_version, previous_url = get_latest_release(
+            family, cache_dir=release_cache
         )
-        url_split = repo_url.split("/")
-        user, repo = url_split[3], url_split[4]
-
-    g = Github(os.environ["GITHUB_TOKEN"])
-    repo = g.get_repo(user + "/" + repo)
-    for release in repo.get_releases():
-        if release.draft:
-            continue
-        m = re.match(r"^(.*)-(v[\d.]+)", release.tag_name)
-        if not m:
-            print(f"Unparsable release {release.tag_name} in {user}/{repo}")
-            continue
-        thisfamily, version = m[1], m[2]
-        if thisfamily != family:
-            continue
-        assets = release.get_assets()
-        download_url = assets[0].browser_download_url
-        return version, download_url
-    return None, None
-
-
-if "GITHUB_TOKEN" not in os.environ:
-    raise ValueError("GITHUB_TOKEN was not passed to the notoqa environment")
-os.environ["GH_TOKEN"] = os.environ["GITHUB_TOKEN"]
-
-outdir = os.path.join("out", "qa")
-os.makedirs(outdir, exist_ok=True)
-all_strings = None
-qa_strings = glob.glob("qa/*.txt")
-
-if qa_strings:
-    all_strings = os.path.join(outdir, "all_strings.txt")
-    with open(all_strings, "w") as out_file:
-        for strings_file in qa_strings:
-            with open(strings_file) as in_file:
-                for line in in_file:
-                    out_file.write(line)
-
-for family in [os.path.basename(x) for x in glob.glob("fonts/*")]:
-    previous_version, previous_url = get_latest_release(family)
     if not previous_version:
-        print(f"No previous release for {family}, skipping")
-        continue
-    print(f"Testing {family} against {previous_version}")
-    fonts_dir = os.path.join(outdir, "fonts")
-    os.makedirs(fonts_dir, exist_ok=True)
+        log(family, f"No previous release for {family}, skipping")
+        return None
+    log(family, f"Testing {family} against {previous_version}")
 
-    fonts_before_dir = os.path.join(outdir, "fonts_before")
+    # Each family gets its own download directory so that several
+    # releases can be unpacked at once.
+    fonts_before_dir = os.path.join(outdir, "fonts_before", family)
     os.makedirs(fonts_before_dir, exist_ok=True)
 
-    fonts_before = download_files_from_archive(previous_url, fonts_before_dir)
-    variables_before = [
-        f for f in fonts_before if f.endswith(".ttf") and "unhinted/variable-ttf" in f
-    ]
-    fonts_now = glob.glob(f"fonts/{family}/unhinted/ttf/*.ttf")
-    variables_now = glob.glob(f"fonts/{family}/unhinted/variable-ttf/*.ttf")
-
-    fonts_before = [f for f in fonts_before if f.endswith(".ttf") and "unhinted" in f]
+    fonts_now = inventory.fonts(family, "unhinted/ttf")
+    variables_now = inventory.fonts(family, "unhinted/variable-ttf")
 
-    if variables_now and variables_before:
-        # Save time, just compare the variables
-        fonts_now = variables_now
-        fonts_before = variables_before
+    archive = previous_release_archive(previous_url, archive_cache, events)
+    with archive, zipfile.ZipFile(archive) as zip_file:
+        members = [
+            n for n in zip_file.namelist() if n.endswith(".ttf") and "unhinted" in n
+        ]
+        # A release may contain several families; only take this one's.
+        members = [n for n in members if n.startswith(family + "/")] or members
+        variables_before = [n for n in members if "unhinted/variable-ttf" in n]
+        if variables_now and variables_before:
+            # Save time, just compare the variables
+            fonts_now = variables_now
+            members = variables_before
+        # Only unpack the fonts we are going to compare
+        for member in members:
+            zip_file.extract(member, fonts_before_dir)
+    fonts_before = [os.path.join(fonts_before_dir, n) for n in members]
 
-    print("Fonts before: ")
-    for s in fonts_before:
-        print(" * " + s)
-
-    print("Fonts now: ")
-    for s in fonts_now:
-        print(" * " + s)
+    log(family, "Fonts before: " + ", ".join(fonts_before))
+    log(family, "Fonts now: " + ", ".join(fonts_now))
 
     if not fonts_now:
-        print(f"No current fonts to compare for {family}!")
-        continue
+        log(family, f"No current fonts to compare for {family}!")
+        return fonts_before_dir, []
     if not fonts_before:
-        print(f"No previous fonts to compare for {family}!")
-        continue
+        log(family, f"No previous fonts to compare for {family}!")
+        return fonts_before_dir, []
 
     if len(fonts_before) == 1 and len(fonts_now) == 1:
-        subprocess.run(
-            [
-                "diffenator3",
-                fonts_before[0],
-                fonts_now[0],
-                "--html",
-                "--output",
-                os.path.join(outdir, family),
-                # user_wordlist=all_strings)
-            ],
-            check=True,
-        )
+        return fonts_before_dir, [(fonts_before[0], fonts_now[0], None)]
+
+    # Try to match them up
+    pairs = []
+    for before in fonts_before:
+        before_bare = before.replace(fonts_before_dir, "fonts")
+        if before_bare in fonts_now:
+            pairs.append((before, before_bare, f"{os.path.basename(before)}.html"))
+        else:
+            log(family, f"Could not find a match for {before}")
+    return fonts_before_dir, pairs
+
+
+def run_diffenator(family, outdir, before, now, report_name, manifest, events=None):
+    family_dir = os.path.join(outdir, family)
+    report = os.path.join(family_dir, report_name or "diffenator.html")
+    # A new build always has a newer version number than the last release
+    fingerprints = {
+        "before": fingerprint(before, ignore_version=True),
+        "now": fingerprint(now, ignore_version=True),
+    }
+    if manifest.get(now) == fingerprints and os.path.exists(report):
+        log(os.path.basename(now), "No change since the last comparison, skipping")
+        if events is not None:
+            events.record("skipped", os.path.basename(now), status=0)
+        return 0
+    if unchanged(fingerprints["before"], fingerprints["now"]):
+        log(os.path.basename(now), "No change since the previous release")
+        if events is not None:
+            events.record("skipped", os.path.basename(now), status=0)
+        no_change_report(report, before, now)
+        manifest.set(now, fingerprints)
+        return 0
+
+    if report_name is None:
+        output = family_dir
     else:
-        # Try to match them up
-        for before in fonts_before:
-            before_bare = before.replace(os.path.join(outdir, "fonts_before"), "fonts")
-            if before_bare in fonts_now:
-                subprocess.run(
-                    [
-                        "diffenator3",
-                        before,
-                        before_bare,
-                        "--html",
-                        "--output",
-                        os.path.join(outdir, family),
-                        # user_wordlist=all_strings)
-                    ],
-                    check=True,
-                )
-                os.rename(
-                    os.path.join(outdir, family, "diffenator.html"),
-                    os.path.join(outdir, family, f"{os.path.basename(before)}.html"),
-                )
-            else:
-                print(f"Could not find a match for {before}")
-
-    # Remove the fonts_before directory
-    shutil.rmtree(fonts_before_dir)
-
-if glob.glob(outdir + "/*"):
-    build_index_page(outdir)
+        # Pairs within a family run concurrently, so each one writes into
+        # its own directory and the report is moved into place afterwards.
+        output = os.path.join(family_dir, "." + report_name)
+    returncode = run_command(
+        [
+            "diffenator3",
+            before,
+            now,
+            "--html",
+            "--output",
+            output,
+            # user_wordlist=all_strings)
+        ],
+        os.path.basename(now),
+        events,
+    )
+    if report_name is not None and os.path.isdir(output):
+        for entry in os.listdir(output):
+            target = os.path.join(family_dir, entry)
+            if entry == "diffenator.html":
+                target = os.path.join(family_dir, report_name)
+            elif os.path.exists(target):
+                continue
+            os.replace(os.path.join(output, entry), target)
+        shutil.rmtree(output)
+    if returncode == 0:
+        manifest.set(now, fingerprints)
+    return returncode
+
+
+def remove_when_done(futures, path):
+    """Delete a downloaded release once all the diffs using it are done"""
+    if not futures:
+        shutil.rmtree(path, ignore_errors=True)
+        return
+    remaining = [len(futures)]
+    lock = threading.Lock()
+
+    def done(_):
+        with lock:
+            remaining[0] -= 1
+            finished = remaining[0] == 0
+        if finished:
+            shutil.rmtree(path, ignore_errors=True)
+
+    for future in futures:
+        future.add_done_callback(done)
+
+
+def add_regression_arguments(parser):
+    parser.add_argument(
+        "--downloads",
+        type=int,
+        default=2,
+        help="Number of previous releases to download concurrently (default: 2)",
+    )
+    parser.add_argument(
+        "--release-cache",
+        help="Directory in which to cache the repository's release index",
+    )
+    parser.add_argument(
+        "--archive-cache",
+        default=os.path.join(default_cache_dir(), "archives"),
+        help="Directory in which to cache previous release archives",
+    )
+    parser.add_argument(
+        "--archive-cache-size",
+        type=int,
+        default=2048,
+        help="Maximum size of the release archive cache in megabytes (default: 2048)",
+    )
+
+
+class RegressionStage(object):
+    name = "regression"
+
+    def __init__(self, args):
+        self.args = args
+
+    def start(self, inventory, scheduler):
+        self.outdir = os.path.join("out", "qa")
+        os.makedirs(self.outdir, exist_ok=True)
+        all_strings = None
+        qa_strings = glob.glob("qa/*.txt")
+
+        if qa_strings:
+            all_strings = os.path.join(self.outdir, "all_strings.txt")
+            with open(all_strings, "w") as out_file:
+                for strings_file in qa_strings:
+                    with open(strings_file) as in_file:
+                        for line in in_file:
+                            out_file.write(line)
+
+        self.archive_cache = ContentCache(
+            self.args.archive_cache,
+            max_size=self.args.archive_cache_size * 1024 * 1024,
+        )
+        self.manifest = FingerprintManifest(
+            os.path.join(self.outdir, "fingerprints.json")
+        )
+        self.inventory = inventory
+        self.scheduler = scheduler
+        self.events = EventLog(self.name)
+        # Downloads have a pool of their own, so releases are fetched while
+        # fonts are being compared; the comparisons go to the shared pool
+        # as soon as each family's release is ready.
+        self.download_pool = ThreadPoolExecutor(max_workers=max(1, self.args.downloads))
+        self.fetches = {
+            self.download_pool.submit(self.fetch, family): family
+            for family in inventory.families
+        }
+
+    def fetch(self, family):
+        """Fetch a family's previous release and schedule its comparisons,
+        returning a list of (future, font) for them"""
+        result = fetch_previous_fonts(
+            family,
+            self.outdir,
+            self.inventory,
+            self.archive_cache,
+            self.events,
+            self.args.release_cache,
+        )
+        if result is None:
+            return []
+        fonts_before_dir, pairs = result
+        os.makedirs(os.path.join(self.outdir, family), exist_ok=True)
+        diffs = [
+            (
+                self.scheduler.submit(
+                    run_diffenator,
+                    family,
+                    self.outdir,
+                    before,
+                    now,
+                    report_name,
+                    self.manifest,
+                    self.events,
+                    memory=estimate_memory([before, now]),
+                ),
+                now,
+            )
+            for before, now, report_name in pairs
+        ]
+        remove_when_done([diff for diff, _ in diffs], fonts_before_dir)
+        return diffs
+
+    def finish(self):
+        failures = []
+        diffs = {}
+        for future in as_completed(self.fetches):
+            family = self.fetches[future]
+            try:
+                diffs.update(future.result())
+            except Exception as e:
+                log(family, f"Could not fetch previous release: {e}")
+                failures.append(family)
+        self.download_pool.shutdown()
+
+        for diff in as_completed(diffs):
+            try:
+                returncode = diff.result()
+            except Exception as e:
+                log(diffs[diff], f"diffenator3 failed: {e}")
+                returncode = 1
+            if returncode:
+                failures.append(diffs[diff])
+
+        shutil.rmtree(os.path.join(self.outdir, "fonts_before"), ignore_errors=True)
+        self.manifest.save()
+
+        # The fingerprint manifest lives here too, so look for the reports
+        if glob.glob(self.outdir + "/**/*.html", recursive=True):
+            build_index_page(self.outdir)
+
+        self.events.close(1 if failures else 0)
+        if failures:
+            log(self.name, f"{len(failures)} regression test(s) failed:")
+            for failure in sorted(failures):
+                log(self.name, " * " + failure)
+            return 1
+        return 0
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description="Compare fonts against the last release")
+    add_jobs_argument(parser)
+    add_regression_arguments(parser)
+    args = parser.parse_args(args)
+
+    if "GITHUB_TOKEN" not in os.environ:
+        raise ValueError("GITHUB_TOKEN was not passed to the notoqa environment")
+    os.environ["GH_TOKEN"] = os.environ["GITHUB_TOKEN"]
+
+    stage = RegressionStage(args)
+    with Scheduler(args.jobs) as scheduler:
+        stage.start(FontInventory(), scheduler)
+        return stage.finish()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
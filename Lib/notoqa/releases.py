@@ -0,0 +1,130 @@
+import json
+import os
+import re
+import subprocess
+import urllib.request
+from urllib.error import HTTPError
+
+from notoqa.jobs import log
+
+RELEASE_TAG_RE = r"^(.*)-(v[\d.]+)"
+LINK_NEXT_RE = r'<([^>]+)>;\s*rel="next"'
+
+
+def origin_repo():
+    """Return the (user, repo) of the git remote called origin"""
+    repo_url = (
+        subprocess.check_output(["git", "remote", "get-url", "origin"])
+        .decode("utf8")
+        .strip()
+    )
+    url_split = repo_url.split("/")
+    return url_split[3], url_split[4]
+
+
+class ReleaseIndex(object):
+    """The newest non-draft release of each family in a GitHub repository.
+
+    The index is built with a single paginated pass over the releases API.
+    If a cache directory is given, the index is stored there along with the
+    ETag of the first page of results; on the next run that page is fetched
+    conditionally, and if GitHub answers 304 Not Modified there are no new
+    releases and the cached index is used without any further requests."""
+
+    def __init__(self, user, repo, token=None, cache_dir=None, api_url=None):
+        self.user = user
+        self.repo = repo
+        self.token = token
+        self.cache_dir = cache_dir
+        self.api_url = (
+            api_url or os.environ.get("GITHUB_API_URL") or "https://api.github.com"
+        ).rstrip("/")
+        self.releases = {}
+        self.etag = None
+
+    @property
+    def cache_path(self):
+        if not self.cache_dir:
+            return None
+        return os.path.join(self.cache_dir, f"{self.user}_{self.repo}.json")
+
+    def _request(self, url, etag=None):
+        headers = {"Accept": "application/vnd.github+json"}
+        if self.token:
+            headers["Authorization"] = f"Bearer {self.token}"
+        if etag:
+            headers["If-None-Match"] = etag
+        request = urllib.request.Request(url, headers=headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return (
+                    response.status,
+                    json.load(response),
+                    response.headers.get("ETag"),
+                    response.headers.get("Link", ""),
+                )
+        except HTTPError as e:
+            if e.code == 304:
+                return 304, None, etag, ""
+            raise
+
+    def _load_cache(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return False
+        try:
+            with open(self.cache_path) as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return False
+        self.etag = cached.get("etag")
+        self.releases = {
+            family: tuple(release)
+            for family, release in cached.get("releases", {}).items()
+        }
+        return bool(self.etag)
+
+    def _save_cache(self):
+        if not self.cache_path or not self.etag:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self.cache_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"etag": self.etag, "releases": self.releases}, f, indent=1)
+        os.replace(tmp, self.cache_path)
+
+    def _add(self, release):
+        if release.get("draft"):
+            return
+        m = re.match(RELEASE_TAG_RE, release["tag_name"])
+        if not m:
+            log(
+                "releases",
+                f"Unparsable release {release['tag_name']} in {self.user}/{self.repo}",
+            )
+            return
+        family, version = m[1], m[2]
+        # Releases are listed newest first, so the first one we see wins.
+        if family in self.releases or not release.get("assets"):
+            return
+        self.releases[family] = (version, release["assets"][0]["browser_download_url"])
+
+    def load(self):
+        url = f"{self.api_url}/repos/{self.user}/{self.repo}/releases?per_page=100"
+        have_cache = self._load_cache()
+        status, page, etag, link = self._request(url, self.etag if have_cache else None)
+        if status == 304:
+            return self
+        self.releases = {}
+        self.etag = etag
+        while True:
+            for release in page:
+                self._add(release)
+            m = re.search(LINK_NEXT_RE, link)
+            if not m:
+                break
+            _, page, _, link = self._request(m[1])
+        self._save_cache()
+        return self
+
+    def latest(self, family):
+        return self.releases.get(family, (None, None))
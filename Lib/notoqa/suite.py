@@ -0,0 +1,69 @@
+"""Run fontspector, proofs and regression tests together.
+
+All three stages work from one inventory of fonts/, and their jobs share a
+single pool of workers with one limit on concurrency and one memory budget,
+so the suite takes about as long as its slowest job rather than the sum of
+its stages. The results are written to the same places in out/ as the
+separate stages write them."""
+import argparse
+import os
+import sys
+import time
+
+from notocommon.memory import add_memory_argument
+from notoqa.__main__ import FontspectorStage
+from notoqa.inventory import FontInventory
+from notoqa.jobs import Scheduler, add_jobs_argument, log
+from notoqa.proof import ProofStage
+from notoqa.regression import RegressionStage, add_regression_arguments
+
+STAGES = ["fontspector", "proof", "regression"]
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Run fontspector, proofs and regression tests on all fonts"
+    )
+    add_jobs_argument(parser)
+    add_memory_argument(parser)
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        choices=STAGES,
+        default=STAGES,
+        help="Stages to run (default: all of them)",
+    )
+    add_regression_arguments(parser)
+    args = parser.parse_args(args)
+
+    stages = []
+    if "fontspector" in args.stages:
+        stages.append(FontspectorStage())
+    if "proof" in args.stages:
+        stages.append(ProofStage())
+    if "regression" in args.stages:
+        if "GITHUB_TOKEN" in os.environ:
+            os.environ["GH_TOKEN"] = os.environ["GITHUB_TOKEN"]
+            stages.append(RegressionStage(args))
+        else:
+            log("regression", "GITHUB_TOKEN is not set, skipping regression tests")
+
+    start = time.monotonic()
+    inventory = FontInventory()
+    memory = args.max_memory * 1024 * 1024 if args.max_memory else None
+    results = []
+    with Scheduler(args.jobs, memory) as scheduler:
+        for stage in stages:
+            stage.start(inventory, scheduler)
+        # Every stage's jobs are queued before any stage is waited on
+        for stage in stages:
+            results.append((stage.name, stage.finish()))
+
+    print(f"QA finished in {time.monotonic() - start:.1f}s:")
+    for name, status in results:
+        print(f" * {name}: {'failed' if status else 'passed'}")
+    return 1 if any(status for _, status in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+"""Benchmark the UI-VF derivation steps in builduivf.
+
+The in-place glyph offset in transform is compared with the pen-based
+redraw it replaced, and grovel_substitutions is timed remapping the GSUB
+table of a synthetic font in which every glyph has a UI variant.
+
+    python benchmarks/bench_builduivf.py --glyphs 20000
+"""
+import argparse
+import time
+
+from fontTools.pens.transformPen import TransformPen
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+from notobuilder.builduivf import grovel_substitutions, transform, ui_glyphmap
+from synthetic import synthetic_font
+
+
+def pen_transform(ttfont, x, y):
+    glyphset = ttfont.getGlyphSet()
+
+    for glyphname in glyphset.keys():
+        glyph = glyphset[glyphname]
+        if glyph._getGlyphAndOffset()[0].numberOfContours < 1:
+            continue
+        pen = TTGlyphPen(glyphset)
+        transformpen = TransformPen(pen, (1, 0, 0, 1, x, y))
+        glyph.draw(transformpen)
+        ttfont["glyf"].glyphs[glyphname] = pen.glyph()
+
+
+def timed(func, font):
+    start = time.perf_counter()
+    func(font, 10, -20)
+    return time.perf_counter() - start
+
+
+def remap_gsub(ttfont):
+    glyphmap = ui_glyphmap(ttfont)
+    for lookup in ttfont["GSUB"].table.LookupList.Lookup:
+        grovel_substitutions(ttfont, lookup, glyphmap)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--glyphs", type=int, default=10000)
+    args = parser.parse_args()
+
+    pens = timed(pen_transform, synthetic_font(args.glyphs))
+    in_place = timed(transform, synthetic_font(args.glyphs))
+    print(f"{args.glyphs} glyphs")
+    print(f"  transform, pen-based: {pens:.3f}s")
+    print(f"  transform, in-place:  {in_place:.3f}s ({pens / in_place:.1f}x)")
+
+    font = synthetic_font(args.glyphs, ui=True)
+    font["GSUB"].table.LookupList  # decompile before timing
+    start = time.perf_counter()
+    remap_gsub(font)
+    print(f"  GSUB remapping:       {time.perf_counter() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compare reading documentation metadata with FontMetadata against
+loading the same information through a full TTFont.
+
+    python benchmarks/bench_fontinfo.py --glyphs 60000
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from fontTools.ttLib import TTFont
+
+from notobuilder.fontinfo import FontMetadata
+from synthetic import synthetic_font
+
+
+def with_ttfont(path):
+    font = TTFont(path)
+    font.getBestCmap()
+    font["name"].getDebugName(1)
+    len(font.getGlyphOrder())
+    for tag in ("GSUB", "GPOS"):
+        if tag in font:
+            [r.FeatureTag for r in font[tag].table.FeatureList.FeatureRecord]
+    # Like primary_script, make sure the lookups are decompiled
+    if "GSUB" in font:
+        for lookup in font["GSUB"].table.LookupList.Lookup:
+            lookup.SubTable
+
+
+def with_metadata(path):
+    font = FontMetadata(path)
+    font.codepoints()
+    font.name.getDebugName(1)
+    font.num_glyphs
+    for tag in ("GSUB", "GPOS"):
+        font.feature_tags(tag)
+    font.stat_axis_tags()
+    font.fvar_axes()
+
+
+def measure(func, path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func(path)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--glyphs", type=int, default=20000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "Synthetic-Regular.ttf")
+        synthetic_font(args.glyphs, ui=True).save(path)
+        print(f"{args.glyphs} glyphs, {os.path.getsize(path) / 1024:.0f}KB")
+        for label, func in (("TTFont", with_ttfont), ("FontMetadata", with_metadata)):
+            elapsed, peak = measure(func, path)
+            print(f"  {label:12s} {elapsed:.3f}s, peak {peak:.1f}MB")
+
+
+if __name__ == "__main__":
+    main()
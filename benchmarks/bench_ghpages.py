@@ -0,0 +1,101 @@
+"""Benchmark reading the fonts/ and out/ trees for the gh-pages report.
+
+The listdir/isdir/isfile recursion and per-family globs which the report
+used to do are compared with a single TreeIndex walk, on a synthetic tree
+of empty files laid out like a Noto repository. The size of the inlined
+HTML file trees is compared with that of the JSON listings which the page
+now loads on demand.
+
+    python benchmarks/bench_ghpages.py --families 20 --statics 100
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from glob import glob
+
+from notobuilder.ghpages.__main__ import family_reports
+from notocommon.tree import TreeIndex
+from synthetic import synthetic_tree
+
+class ListdirTreeMaker(object):
+    """The file tree as it used to be made"""
+
+    def _recurse(self, parent_path, file_list, output_buf, level):
+        if len(file_list) == 0:
+            return
+        file_list.sort(key=lambda f: os.path.isfile(os.path.join(parent_path, f)))
+        for sub_path in file_list:
+            full_path = os.path.join(parent_path, sub_path)
+            if os.path.isdir(full_path):
+                output_buf.append(f'<li class="li-{level}">{sub_path}<ul>')
+                self._recurse(full_path, os.listdir(full_path), output_buf, level + 1)
+            elif os.path.isfile(full_path):
+                output_buf.append(f'<li><a href="{full_path}"> {sub_path}</a></li>')
+        output_buf.append(" </ul>")
+
+    def make(self, root):
+        buf = ["<ul>"]
+        self._recurse(root, os.listdir(root), buf, 0)
+        return "\n".join(buf)
+
+
+def with_listdir():
+    size = 0
+    for family in glob("fonts/*"):
+        basename = os.path.basename(family)
+        size += len(ListdirTreeMaker().make(family))
+        glob(f"out/fontspector/*{basename}*html")
+        glob(f"out/qa/{basename}/Diffenator/*/report.html")
+        glob(f"out/proof/{basename}/*html")
+    glob("fonts/*/unhinted/ttf/*.ttf")
+    return size
+
+
+def with_index():
+    size = 0
+    fonts = TreeIndex.scan("fonts")
+    out = TreeIndex.scan("out")
+    for family in fonts.directories.values():
+        size += len(json.dumps(family.listing(), separators=(",", ":")))
+        family_reports(os.path.basename(family.path), out)
+    fonts.glob("*/unhinted/ttf/*.ttf")
+    return size
+
+
+def timed(func, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        size = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--families", type=int, default=20)
+    parser.add_argument("--statics", type=int, default=100)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        synthetic_tree(tmp, args.families, args.statics)
+        os.chdir(tmp)
+        try:
+            files = sum(len(f) for _, _, f in os.walk("."))
+            print(f"{args.families} families, {files} files")
+            for label, func, kind in (
+                ("listdir and globs", with_listdir, "inline HTML"),
+                ("TreeIndex", with_index, "JSON"),
+            ):
+                elapsed, size = timed(func)
+                print(f"  {label:18s} {elapsed:.3f}s, {size / 1024:.0f}KB of {kind}")
+        finally:
+            os.chdir(cwd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Check that importing notobuilder.documentation stays cheap.
+
+The module's Unicode data, language data, templates and HTML tools are
+loaded lazily. This measures the import with `python -X importtime`, and
+fails if it goes over budget or if any of the heavy dependencies are
+imported eagerly again.
+
+    python benchmarks/bench_import.py --budget 200
+"""
+import argparse
+import re
+import subprocess
+import sys
+
+MODULE = "notobuilder.documentation"
+LAZY_MODULES = ["gftools", "gflanguages", "youseedee", "jinja2", "markdown", "tidylib"]
+
+
+def import_times(module):
+    """Return a dictionary of cumulative import times in microseconds"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        m = re.match(r"import time:\s*\d+ \|\s*(\d+) \|(\s*)(\S+)", line)
+        if m:
+            times[m[3]] = int(m[1])
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=float, default=200, help="milliseconds")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [import_times(MODULE) for _ in range(args.runs)]
+    best = min(run[MODULE] for run in runs) / 1000
+    print(f"import {MODULE}: {best:.1f}ms (budget {args.budget:.0f}ms)")
+
+    failed = False
+    eager = sorted(
+        {m for m in runs[0] if m.split(".")[0] in LAZY_MODULES}, key=len
+    )
+    if eager:
+        print("Imported eagerly: " + ", ".join(eager))
+        failed = True
+    if best > args.budget:
+        print("Over budget")
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Measure the per-document cost of turning documentation Markdown into HTML.
+
+The old path built a new Markdown converter and a new tidy document for
+every page; render_html reuses one of each.
+
+    python benchmarks/bench_render.py --documents 500
+"""
+import argparse
+import time
+
+import markdown
+from tidylib import tidy_document
+
+from notobuilder.documentation import TIDY_OPTIONS, render_html, scripts_info, template
+
+VARIABLES = dict(
+    family_name="Noto Sans Synthetic",
+    stub=None,
+    glyphs_count=3000,
+    features_count=12,
+    unicodes_count=2500,
+    style="Sans",
+    variant=None,
+    is_mono=False,
+    is_UI=False,
+    axes="multiple weights and widths,",
+    scripts=["Latn", "Grek", "Cyrl"],
+    blocks=["Basic Latin", "Latin-1 Supplement", "Greek and Coptic", "Cyrillic"],
+)
+
+
+def per_document(func, documents):
+    start = time.perf_counter()
+    for md in documents:
+        func(md)
+    return (time.perf_counter() - start) / len(documents)
+
+
+def old_render(md):
+    return tidy_document(markdown.markdown(md), TIDY_OPTIONS)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--documents", type=int, default=500)
+    args = parser.parse_args()
+
+    pages = [
+        template(name).render(scripts_info=scripts_info(), **VARIABLES)
+        for name in ("font_article.md", "font_desc.md")
+    ]
+    documents = [pages[i % 2] for i in range(args.documents)]
+    # Warm up both paths so that import and library loading are not counted
+    old_render(pages[0])
+    render_html(pages[0])
+
+    old = per_document(old_render, documents)
+    new = per_document(render_html, documents)
+    print(f"{args.documents} documents")
+    print(f"  markdown.markdown + tidy_document  {old * 1000:.2f}ms/doc")
+    print(f"  render_html                        {new * 1000:.2f}ms/doc")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Time and memory-profile the expensive entry points on synthetic data.
+
+Fonts of 1k, 10k and 60k glyphs (with large cmaps and GSUB tables of many
+ligature and chained contextual lookups) and fonts/ trees of increasing
+size are generated, and each case is run on each of them: the best wall
+time of several runs and the peak Python allocation of one more run under
+tracemalloc are recorded. Results are saved as JSON, and can be compared
+with the results of an earlier run, for example on another commit:
+
+    python benchmarks/suite.py --output before.json
+    git checkout my-branch
+    python benchmarks/suite.py --output after.json --compare before.json
+
+Generated fonts are kept in --fixtures, if given, so that later runs can
+skip making them.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from fontTools.ttLib import TTFont
+
+from notobuilder.builduivf import grovel_substitutions, transform, ui_glyphmap
+from notobuilder.documentation import FontDescription
+from notobuilder.ghpages.__main__ import family_reports
+from notocommon.tree import TreeIndex
+from synthetic import synthetic_font, synthetic_tree
+
+# Glyph count: number of lookup groups in the UI font's GSUB
+FONT_SIZES = {1000: 10, 10000: 40, 60000: 100}
+# Families: statics per family and format
+TREE_SIZES = {5: 20, 20: 100, 60: 200}
+
+
+def font_fixture(fixtures, glyphs, ui=False):
+    path = os.path.join(fixtures, f"Synthetic{'UI' if ui else ''}-{glyphs}.ttf")
+    if not os.path.exists(path):
+        synthetic_font(glyphs, ui=ui, lookups=FONT_SIZES[glyphs]).save(path)
+    return path
+
+
+def tree_fixture(fixtures, families):
+    root = os.path.join(fixtures, f"tree-{families}")
+    if not os.path.exists(root):
+        synthetic_tree(root, families, TREE_SIZES[families])
+    return root
+
+
+# Each case is a pair of functions: one to set up (untimed) from a fixture,
+# and one to run on what it returns.
+
+
+def load_glyf(path):
+    font = TTFont(path)
+    font["glyf"], font["hmtx"]
+    return font
+
+
+def load_gsub(path):
+    font = TTFont(path)
+    font["GSUB"].table.LookupList
+    return font
+
+
+def remap_gsub(font):
+    glyphmap = ui_glyphmap(font)
+    for lookup in font["GSUB"].table.LookupList.Lookup:
+        grovel_substitutions(font, lookup, glyphmap)
+
+
+def index_tree(root):
+    fonts = TreeIndex.scan(os.path.join(root, "fonts"))
+    out = TreeIndex.scan(os.path.join(root, "out"))
+    for family in fonts.directories.values():
+        json.dumps(family.listing(), separators=(",", ":"))
+        family_reports(os.path.basename(family.path), out)
+    fonts.glob("*/unhinted/ttf/*.ttf")
+
+
+CASES = {
+    "builduivf.transform": (
+        "font",
+        load_glyf,
+        lambda font: transform(font, 10, -20),
+    ),
+    "builduivf.grovel_substitutions": ("ui-font", load_gsub, remap_gsub),
+    "documentation.FontDescription": (
+        "font",
+        Path,
+        lambda path: FontDescription(path, {}),
+    ),
+    "ghpages.TreeIndex": ("tree", lambda root: root, index_tree),
+}
+
+
+def measure(setup, func, fixture, repeat):
+    """Best wall time of repeat runs, and peak traced memory of one more"""
+    best = None
+    for _ in range(repeat):
+        arg = setup(fixture)
+        start = time.perf_counter()
+        func(arg)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    arg = setup(fixture)
+    tracemalloc.start()
+    func(arg)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, previous):
+    before = {(r["case"], r["size"]): r for r in previous["results"]}
+    print(f"Compared with {previous.get('commit') or 'previous run'}:")
+    for result in results:
+        old = before.get((result["case"], result["size"]))
+        if not old:
+            continue
+        print(
+            f"  {result['case']:32s} {result['size']:>6} "
+            f"time {result['seconds'] / max(old['seconds'], 0.0001):5.2f}x "
+            f"memory {result['peak_mb'] / max(old['peak_mb'], 0.001):5.2f}x"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--cases", nargs="+", choices=CASES, default=list(CASES), help="Cases to run"
+    )
+    parser.add_argument(
+        "--glyphs",
+        nargs="+",
+        type=int,
+        choices=FONT_SIZES,
+        default=list(FONT_SIZES),
+        help="Font sizes to run the font cases on",
+    )
+    parser.add_argument(
+        "--families",
+        nargs="+",
+        type=int,
+        choices=TREE_SIZES,
+        default=list(TREE_SIZES),
+        help="Tree sizes to run the tree cases on",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--fixtures", help="Directory to keep generated fixtures in")
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="Results of an earlier run to compare with")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixtures = args.fixtures or tmp
+        os.makedirs(fixtures, exist_ok=True)
+        results = []
+        for name in args.cases:
+            kind, setup, func = CASES[name]
+            if kind == "tree":
+                sizes = [
+                    (f"{f}x{TREE_SIZES[f]}", tree_fixture(fixtures, f))
+                    for f in args.families
+                ]
+            else:
+                sizes = [
+                    (f"{g // 1000}k", font_fixture(fixtures, g, ui=kind == "ui-font"))
+                    for g in args.glyphs
+                ]
+            for size, fixture in sizes:
+                seconds, peak = measure(setup, func, fixture, args.repeat)
+                results.append(
+                    {
+                        "case": name,
+                        "size": size,
+                        "seconds": round(seconds, 4),
+                        "peak_mb": round(peak / 1024 / 1024, 2),
+                    }
+                )
+                print(
+                    f"{name:32s} {size:>6} {seconds:8.3f}s "
+                    f"peak {peak / 1024 / 1024:7.1f}MB",
+                    flush=True,
+                )
+
+    report = {
+        "commit": git_commit(),
+        "date": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+"""Synthetic fonts and font trees for the benchmarks.
+
+The fonts are built with fontTools: every glyph has a few quadratic
+contours, the cmap covers real letters (Latin, Greek and Cyrillic, then CJK
+and Hangul for the bigger fonts) so that script and block statistics have
+something to count, and UI fonts have a UI variant of every glyph and a
+GSUB table of single, ligature and chained contextual lookups over them.
+The trees are empty files laid out like a Noto repository's fonts/ and
+out/ directories.
+"""
+import os
+
+from fontTools.feaLib.builder import addOpenTypeFeaturesFromString
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+
+LETTER_RANGES = [
+    (0x0041, 0x005A),
+    (0x0061, 0x007A),
+    (0x00C0, 0x024F),
+    (0x0386, 0x03CE),
+    (0x0400, 0x04FF),
+    (0x4E00, 0x9FFF),
+    (0xAC00, 0xD7A3),
+    (0x3400, 0x4DBF),
+    (0x20000, 0x2A6DF),
+]
+
+HINTING = ["hinted", "unhinted", "googlefonts"]
+FORMATS = ["ttf", "otf", "slim-variable-ttf", "variable-ttf"]
+REPORTS = ["unhinted", "hinted", "googlefonts"]
+PROOFS = ["glyphs", "text", "waterfall", "proofer"]
+
+
+def letters(count):
+    """The first count codepoints of LETTER_RANGES"""
+    codepoints = []
+    for first, last in LETTER_RANGES:
+        codepoints.extend(range(first, min(last + 1, first + count - len(codepoints))))
+        if len(codepoints) == count:
+            break
+    return codepoints
+
+
+def synthetic_font(count, ui=False, lookups=1):
+    """A TrueType font of count glyphs (plus .notdef). A UI font is half
+    base glyphs and half their UI variants, with lookups groups of layout
+    rules in its GSUB table."""
+    if ui:
+        base = [f"glyph{i:05d}" for i in range(count // 2)]
+        names = [".notdef"] + base + [name + "UI" for name in base]
+    else:
+        names = [".notdef"] + [f"glyph{i:05d}" for i in range(count)]
+    glyphs = {}
+    for i, name in enumerate(names):
+        pen = TTGlyphPen(None)
+        for contour in range(3):
+            left = contour * 150 + i % 50
+            pen.moveTo((left, 0))
+            pen.qCurveTo((left + 50, 200), (left + 100, 0))
+            pen.lineTo((left + 100, 700))
+            pen.lineTo((left, 700))
+            pen.closePath()
+        glyphs[name] = pen.glyph()
+    fb = FontBuilder(1000, isTTF=True)
+    fb.setupGlyphOrder(names)
+    fb.setupCharacterMap(dict(zip(letters(len(names) - 1), names[1:])))
+    fb.setupGlyf(glyphs)
+    fb.setupHorizontalMetrics({name: (600, glyphs[name].xMin) for name in names})
+    fb.setupHorizontalHeader(ascent=800, descent=-200)
+    fb.setupNameTable({"familyName": "Noto Sans Synthetic", "styleName": "Regular"})
+    fb.setupOS2()
+    fb.setupPost()
+    if ui:
+        addOpenTypeFeaturesFromString(fb.font, synthetic_features(base, lookups))
+    return fb.font
+
+
+def synthetic_features(base, lookups=1):
+    """A single substitution over the base glyphs, then for each group a
+    ligature lookup and chained rules applying it in context, each group
+    over a different stretch of the glyphs"""
+    half = len(base) // 2
+    first = " ".join(base[:half])
+    second = " ".join(base[half : half * 2])
+    fea = [
+        f"@first = [{first}];",
+        f"@second = [{second}];",
+        "lookup single { sub @first by @second; } single;",
+    ]
+    calt = ["  sub @second @first' lookup single @second;"]
+    step = max(3, (len(base) - 3) // max(lookups, 1))
+    for group in range(lookups):
+        start = group * step % max(len(base) - 3, 1)
+        stretch = base[start : start + min(step, 3000)]
+        ligatures = "\n".join(
+            f"  sub {stretch[i]} {stretch[i + 1]} by {stretch[i + 2]};"
+            for i in range(0, len(stretch) - 2, 3)
+        )
+        fea.append(f"lookup ligatures{group} {{\n{ligatures}\n}} ligatures{group};")
+        contexts = stretch[:60]
+        calt.extend(
+            f"  sub {contexts[i + 2]} {contexts[i]}' lookup ligatures{group} "
+            f"{contexts[i + 1]}' {contexts[i + 3]};"
+            for i in range(0, len(contexts) - 3, 3)
+        )
+    calt.append("  sub @first' lookup ligatures0 @first;")
+    fea.append("feature calt {\n" + "\n".join(calt) + "\n} calt;")
+    return "\n".join(fea)
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "w").close()
+
+
+def synthetic_tree(root, families, statics):
+    """Lay out fonts/ and out/ under root for the given number of families,
+    each with statics fonts of every hinting and format"""
+    for i in range(families):
+        family = f"NotoSansSynthetic{i:03d}"
+        for hinting in HINTING:
+            for format in FORMATS:
+                for j in range(statics):
+                    touch(
+                        os.path.join(
+                            root, "fonts", family, hinting, format,
+                            f"{family}-Style{j:03d}.{format[-3:]}",
+                        )
+                    )
+        for report in REPORTS:
+            touch(os.path.join(root, "out", "fontspector", f"{family}-{report}.html"))
+        for j in range(min(statics, 10)):
+            style = f"{family}-Style{j:03d}"
+            touch(os.path.join(root, "out", "qa", family, "Diffenator", style, "report.html"))
+            for proof in PROOFS:
+                touch(
+                    os.path.join(
+                        root, "out", "proof", family, f"{style}-diffbrowsers_{proof}.html"
+                    )
+                )
@@ -0,0 +1,214 @@
+import io
+
+import pytest
+from fontTools.feaLib.builder import addOpenTypeFeaturesFromString
+from fontTools.fontBuilder import FontBuilder
+from fontTools.pens.ttGlyphPen import TTGlyphPen
+from fontTools.ttLib import TTFont
+
+from notobuilder.builduivf import make_ui_font, rename_ui_font
+
+def make_font(glyphs, names):
+    """A TrueType font of empty-ish glyphs, with the given names"""
+    fb = FontBuilder(1000, isTTF=True)
+    fb.setupGlyphOrder([".notdef"] + glyphs)
+    fb.setupCharacterMap({0x61 + i: g for i, g in enumerate(glyphs) if "UI" not in g})
+    outlines = {}
+    for g in [".notdef"] + glyphs:
+        pen = TTGlyphPen(None)
+        pen.moveTo((0, 0))
+        pen.lineTo((100, 700))
+        pen.lineTo((200, 0))
+        pen.closePath()
+        outlines[g] = pen.glyph()
+    fb.setupGlyf(outlines)
+    fb.setupHorizontalMetrics({g: (600, 0) for g in outlines})
+    fb.setupHorizontalHeader(ascent=800, descent=-200)
+    fb.setupNameTable(names)
+    fb.setupOS2()
+    fb.setupPost()
+    return fb.font
+
+
+def names(font):
+    return {r.nameID: r.toUnicode() for r in font["name"].names if r.platformID == 3}
+
+
+def test_rename_ribbi_static():
+    font = make_font(
+        ["a"],
+        {
+            "familyName": "Noto Sans Foo",
+            "styleName": "Bold",
+            "uniqueFontIdentifier": "2.001;GOOG;NotoSansFoo-Bold",
+            "fullName": "Noto Sans Foo Bold",
+            "psName": "NotoSansFoo-Bold",
+        },
+    )
+    rename_ui_font(font)
+    result = names(font)
+    assert result[1] == "Noto Sans Foo UI"
+    assert result[2] == "Bold"
+    assert result[3] == "2.001;GOOG;NotoSansFooUI-Bold"
+    assert result[4] == "Noto Sans Foo UI Bold"
+    assert result[6] == "NotoSansFooUI-Bold"
+
+
+def test_rename_non_ribbi_static():
+    font = make_font(
+        ["a"],
+        {
+            "familyName": "Noto Sans Foo Light",
+            "styleName": "Regular",
+            "typographicFamily": "Noto Sans Foo",
+            "typographicSubfamily": "Light",
+            "fullName": "Noto Sans Foo Light",
+            "psName": "NotoSansFoo-Light",
+        },
+    )
+    rename_ui_font(font)
+    result = names(font)
+    assert result[1] == "Noto Sans Foo UI Light"
+    assert result[2] == "Regular"
+    assert result[4] == "Noto Sans Foo UI Light"
+    assert result[6] == "NotoSansFooUI-Light"
+    assert result[16] == "Noto Sans Foo UI"
+    assert result[17] == "Light"
+
+
+FEATURES = """
+markClass acutecomb <anchor 0 500> @TOP;
+markClass gravecomb <anchor 0 600> @TOP;
+
+lookup extsub useExtension {
+    sub b by a;
+} extsub;
+
+feature ss01 {
+    lookup extsub;
+} ss01;
+
+feature rclt {
+    rsub [a aUI]' b by [c b];
+} rclt;
+
+feature kern {
+    pos a b -50;
+    pos aUI b -30;
+    pos b a 10;
+    pos b aUI 20;
+} kern;
+
+feature mark {
+    pos base a <anchor 100 700> mark @TOP;
+    pos base aUI <anchor 200 700> mark @TOP;
+    pos base b <anchor 300 700> mark @TOP;
+    pos ligature f_f <anchor 100 700> mark @TOP
+        ligComponent <anchor 400 700> mark @TOP;
+    pos ligature f_fUI <anchor 150 700> mark @TOP
+        ligComponent <anchor 450 700> mark @TOP;
+} mark;
+
+feature mkmk {
+    pos mark gravecomb <anchor 0 800> mark @TOP;
+} mkmk;
+
+table GDEF {
+    Attach a 1;
+    Attach aUI 2;
+    LigatureCaretByPos f_f 300;
+    LigatureCaretByPos f_fUI 350;
+} GDEF;
+"""
+
+
+def lookups(font, table, lookup_type):
+    """The subtables of a layout table's lookups of one type, looking
+    through extension lookups"""
+    subtables = []
+    for lookup in font[table].table.LookupList.Lookup:
+        for st in lookup.SubTable:
+            if lookup.LookupType == (7 if table == "GSUB" else 9):
+                if st.ExtensionLookupType == lookup_type:
+                    subtables.append(st.ExtSubTable)
+            elif lookup.LookupType == lookup_type:
+                subtables.append(st)
+    return subtables
+
+
+@pytest.fixture
+def ui_font():
+    glyphs = [
+        "a", "b", "c", "f_f", "acutecomb", "gravecomb",
+        "aUI", "f_fUI", "gravecombUI",
+    ]
+    font = make_font(
+        glyphs,
+        {
+            "familyName": "Noto Sans Foo",
+            "styleName": "Regular",
+            "fullName": "Noto Sans Foo Regular",
+            "psName": "NotoSansFoo-Regular",
+        },
+    )
+    addOpenTypeFeaturesFromString(font, FEATURES)
+    make_ui_font(font, {})
+    saved = io.BytesIO()
+    font.save(saved)
+    saved.seek(0)
+    return TTFont(saved)
+
+
+def test_remap_substitutions(ui_font):
+    (extension,) = lookups(ui_font, "GSUB", 1)
+    assert extension.mapping == {"b": "aUI"}
+    (reverse,) = lookups(ui_font, "GSUB", 8)
+    # aUI's own substitution wins over a's
+    assert reverse.Coverage.glyphs == ["aUI"]
+    assert reverse.Substitute == ["b"]
+    assert reverse.LookAheadCoverage[0].glyphs == ["b"]
+
+
+def test_remap_pair_positioning(ui_font):
+    (pairs,) = lookups(ui_font, "GPOS", 2)
+    assert pairs.Format == 1
+    assert pairs.Coverage.glyphs == ["b", "aUI"]
+    after_b, after_a = pairs.PairSet
+    assert [(r.SecondGlyph, r.Value1.XAdvance) for r in after_b.PairValueRecord] == [
+        ("aUI", 20)
+    ]
+    assert [(r.SecondGlyph, r.Value1.XAdvance) for r in after_a.PairValueRecord] == [
+        ("b", -30)
+    ]
+
+
+def test_remap_mark_positioning(ui_font):
+    (mark_base,) = lookups(ui_font, "GPOS", 4)
+    assert mark_base.BaseCoverage.glyphs == ["b", "aUI"]
+    assert [
+        r.BaseAnchor[0].XCoordinate for r in mark_base.BaseArray.BaseRecord
+    ] == [300, 200]
+    assert mark_base.MarkCoverage.glyphs == ["acutecomb", "gravecombUI"]
+    assert [r.MarkAnchor.YCoordinate for r in mark_base.MarkArray.MarkRecord] == [
+        500,
+        600,
+    ]
+
+    (mark_lig,) = lookups(ui_font, "GPOS", 5)
+    assert mark_lig.LigatureCoverage.glyphs == ["f_fUI"]
+    (attach,) = mark_lig.LigatureArray.LigatureAttach
+    assert [
+        c.LigatureAnchor[0].XCoordinate for c in attach.ComponentRecord
+    ] == [150, 450]
+
+    (mark_mark,) = lookups(ui_font, "GPOS", 6)
+    assert mark_mark.Mark2Coverage.glyphs == ["gravecombUI"]
+    assert mark_mark.Mark2Array.Mark2Record[0].Mark2Anchor[0].YCoordinate == 800
+
+
+def test_remap_gdef(ui_font):
+    gdef = ui_font["GDEF"].table
+    assert gdef.AttachList.Coverage.glyphs == ["aUI"]
+    assert gdef.AttachList.AttachPoint[0].PointIndex == [2]
+    assert gdef.LigCaretList.Coverage.glyphs == ["f_fUI"]
+    assert gdef.LigCaretList.LigGlyph[0].CaretValue[0].Coordinate == 350
@@ -0,0 +1,22 @@
+"""Importing notobuilder.documentation must stay within the budget of
+benchmarks/bench_import.py, without eagerly importing its heavy
+dependencies."""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_documentation_import_time():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        filter(None, [os.path.join(ROOT, "Lib"), env.get("PYTHONPATH")])
+    )
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "bench_import.py")],
+        capture_output=True,
+        text=True,
+        env=env,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
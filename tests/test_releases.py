@@ -0,0 +1,100 @@
+"""ReleaseIndex against a fake GitHub releases API served locally"""
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from notoqa.releases import ReleaseIndex
+
+ETAG = '"page-1"'
+
+
+def release(tag, draft=False, assets=True):
+    return {
+        "tag_name": tag,
+        "draft": draft,
+        "assets": (
+            [{"browser_download_url": f"https://example.com/{tag}.zip"}]
+            if assets
+            else []
+        ),
+    }
+
+
+PAGES = {
+    "1": [
+        release("NotoSansFoo-v2.000", draft=True),
+        release("NotoSansFoo-v1.500"),
+        release("nightly"),
+        release("NotoSansBar-v3.000", assets=False),
+    ],
+    "2": [
+        release("NotoSansBar-v2.000"),
+        release("NotoSansFoo-v1.000"),
+    ],
+}
+
+
+class FakeReleases(BaseHTTPRequestHandler):
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((self.path, self.headers.get("If-None-Match")))
+        page = "2" if "page=2" in self.path else "1"
+        if page == "1" and self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = json.dumps(PAGES[page]).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if page == "1":
+            self.send_header("ETag", ETAG)
+            host, port = self.server.server_address
+            self.send_header(
+                "Link",
+                f'<http://{host}:{port}{self.path.split("?")[0]}'
+                '?per_page=100&page=2>; rel="next"',
+            )
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def api():
+    FakeReleases.requests = []
+    server = HTTPServer(("127.0.0.1", 0), FakeReleases)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    yield f"http://{host}:{port}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_release_index(api, tmp_path):
+    index = ReleaseIndex("notofonts", "foo", cache_dir=tmp_path, api_url=api).load()
+    assert index.latest("NotoSansFoo") == (
+        "v1.500",
+        "https://example.com/NotoSansFoo-v1.500.zip",
+    )
+    # The newest Bar release has no assets, so the one before it is used
+    assert index.latest("NotoSansBar") == (
+        "v2.000",
+        "https://example.com/NotoSansBar-v2.000.zip",
+    )
+    assert index.latest("nightly") == (None, None)
+    assert len(FakeReleases.requests) == 2
+
+    # Nothing has changed, so one conditional request is all it takes
+    FakeReleases.requests = []
+    again = ReleaseIndex("notofonts", "foo", cache_dir=tmp_path, api_url=api).load()
+    assert FakeReleases.requests == [
+        ("/repos/notofonts/foo/releases?per_page=100", ETAG)
+    ]
+    assert again.releases == index.releases